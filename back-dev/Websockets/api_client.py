@@ -0,0 +1,115 @@
+# api_client.py
+# Cliente HTTP hacia la API de Django con sesión compartida, caché y coalescencia
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp
+
+logger = logging.getLogger("websocket_server.api_client")
+
+# Conexiones simultáneas a la API por proceso
+API_POOL_LIMIT = int(os.getenv("API_POOL_LIMIT", 100))
+# Segundos que una conexión ociosa se mantiene abierta para reutilizarla
+API_KEEPALIVE_TIMEOUT = float(os.getenv("API_KEEPALIVE_TIMEOUT", 30))
+# Segundos que se reutiliza la resolución DNS del host de la API
+API_DNS_CACHE_TTL = int(os.getenv("API_DNS_CACHE_TTL", 300))
+# Tiempo máximo de una petición completa
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", 10))
+# Segundos que se reutiliza una respuesta (0 desactiva la caché)
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", 5))
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", 256))
+
+
+class ApiClient:
+    """Peticiones GET a la API con una sola sesión aiohttp por proceso
+
+    Las respuestas correctas se guardan ``cache_ttl`` segundos. Si llegan
+    varias peticiones al mismo endpoint mientras una está en curso, todas
+    esperan a esa misma petición en lugar de lanzar otra.
+    """
+
+    def __init__(self, base_url, cache_ttl=API_CACHE_TTL, max_entries=API_CACHE_MAX_ENTRIES):
+        self.base_url = base_url.rstrip("/")
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self._session = None
+        self._cache = {}
+        self._inflight = {}
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    def session(self):
+        # Se crea dentro del event loop que la va a usar
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=API_POOL_LIMIT,
+                keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=API_DNS_CACHE_TTL,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=API_REQUEST_TIMEOUT)
+            )
+        return self._session
+
+    async def get(self, endpoint):
+        """Obtener un endpoint de la API (None si falla)
+
+        El resultado se comparte entre todos los que lo piden: no modificarlo.
+        """
+        cached = self._cache.get(endpoint)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.cache_hits += 1
+                return cached[1]
+            del self._cache[endpoint]
+
+        task = self._inflight.get(endpoint)
+        if task is None:
+            task = asyncio.create_task(self._fetch(endpoint))
+            self._inflight[endpoint] = task
+            task.add_done_callback(lambda _: self._inflight.pop(endpoint, None))
+        else:
+            self.coalesced += 1
+        # shield: si un cliente se desconecta no se cancela la petición de los demás
+        return await asyncio.shield(task)
+
+    async def _fetch(self, endpoint):
+        self.requests += 1
+        try:
+            async with self.session().get(f"{self.base_url}/{endpoint}") as response:
+                if response.status != 200:
+                    logger.error(f"Error al obtener datos de la API: {response.status}")
+                    return None
+                data = await response.json()
+        except Exception as e:
+            logger.error(f"Error al conectar con la API: {e}")
+            return None
+
+        if self.cache_ttl > 0:
+            if len(self._cache) >= self.max_entries:
+                self._evict()
+            self._cache[endpoint] = (time.monotonic() + self.cache_ttl, data)
+        return data
+
+    def _evict(self):
+        now = time.monotonic()
+        for endpoint in [e for e, (expires_at, _) in self._cache.items() if expires_at <= now]:
+            del self._cache[endpoint]
+        # Sin entradas vencidas se descarta la más antigua (orden de inserción)
+        if len(self._cache) >= self.max_entries:
+            del self._cache[next(iter(self._cache))]
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "cached_entries": len(self._cache),
+        }
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -5,9 +5,26 @@ import json
 import logging
 import os
 import datetime
+import multiprocessing
+import multiprocessing.connection
+import random
+import signal
+import time
+from http import HTTPStatus
 import websockets
-import redis
-import aiohttp
+import redis.asyncio as aioredis
+
+from api_client import ApiClient
+from batching import BATCH_CHANNELS, ChannelBatcher
+from broadcast import broadcast
+from cluster import ALL_CHANNELS, CLUSTER_ENABLED, ClusterRelay
+from compression import deflate_extensions
+from connection import ClientConnection, is_urgent
+from envelope import BINARY_AVAILABLE, Envelope, loads
+from history import HISTORY_SIZE, HISTORY_STREAM, ChannelHistory, HistoryMirror
+from push_api import create_push_app, start_push_server
+from reaper import PING_INTERVAL, PING_TIMEOUT, ConnectionReaper
+from registry import ConnectionRegistry
 
 # Configuración de logging
 logging.basicConfig(
@@ -20,59 +37,271 @@ logger = logging.getLogger("websocket_server")
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 DJANGO_API_URL = os.getenv("DJANGO_API_URL", "http://localhost:8000/api")
+REDIS_CHANNELS = ("police_notifications", "emergency_alerts")
+REDIS_RECONNECT_MIN = float(os.getenv("REDIS_RECONNECT_MIN", 1))
+REDIS_RECONNECT_MAX = float(os.getenv("REDIS_RECONNECT_MAX", 30))
+WS_HOST = os.getenv("WS_HOST", "0.0.0.0")
+WS_PORT = int(os.getenv("WS_PORT", 8765))
+# Puerto de la API HTTP de push (la que llama notification-service)
+HTTP_PORT = int(os.getenv("HTTP_PORT", 8000))
+# Procesos que comparten el puerto con SO_REUSEPORT (requiere WS_CLUSTER=1)
+WS_WORKERS = int(os.getenv("WS_WORKERS", 1))
+# Segundos que se espera a que un worker se cierre antes de matarlo
+WS_WORKER_STOP_TIMEOUT = float(os.getenv("WS_WORKER_STOP_TIMEOUT", 10))
+
+# Clientes conectados, indexados por canal, usuario y rol
+registry = ConnectionRegistry(("emergency", "operations", "admin", "general"))
+
+# Expulsión periódica de conexiones muertas u ociosas
+reaper = ConnectionReaper(registry)
 
-# Clientes conectados
-connected_clients = {}
-active_channels = {
-    "emergency": set(),
-    "operations": set(),
-    "admin": set(),
-    "general": set(),
+# Agrupación de mensajes en los canales configurados (WS_BATCH_CHANNELS)
+batchers = {
+    channel: ChannelBatcher(channel, lambda channel=channel: registry.channel(channel))
+    for channel in BATCH_CHANNELS if registry.is_channel(channel)
 }
 
-async def redis_subscriber():
-    """Suscriptor de Redis para recibir mensajes de otros servicios"""
-    try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
-        pubsub = r.pubsub()
-        pubsub.subscribe("police_notifications", "emergency_alerts")
+# Historial por canal para reanudar tras reconectar (WS_HISTORY_SIZE=0 lo desactiva)
+histories = {
+    channel: ChannelHistory(channel) for channel in registry.channels()
+} if HISTORY_SIZE > 0 else {}
+# Copia del historial en Redis Streams (WS_HISTORY_STREAM=1)
+history_mirror = None
+
+# Retransmisión entre nodos (solo en modo clúster)
+cluster = None
+
+# Sesión HTTP compartida hacia la API de Django
+api_client = ApiClient(DJANGO_API_URL)
+
+# Estado del suscriptor de Redis, expuesto en /health
+subscriber_health = {
+    "connected": False,
+    "connected_since": None,
+    "last_message_at": None,
+    "messages_relayed": 0,
+    "reconnects": 0,
+    "last_error": None,
+}
+
+def deliver_to_channel(channel, envelope, exclude=None):
+    """Entregar un mensaje a los clientes locales de un canal
+
+    En los canales con agrupación el mensaje espera a su lote, salvo los
+    urgentes, que salen de inmediato. Devuelve los clientes a los que se
+    entregó ya (0 si quedó en un lote).
+    """
+    history = histories.get(channel)
+    if history is not None:
+        envelope = history.record(envelope)
+        if history_mirror is not None:
+            history_mirror.append(history, envelope)
+    batcher = batchers.get(channel)
+    if batcher is not None and not is_urgent(envelope):
+        batcher.add(envelope, exclude)
+        return 0
+    return broadcast(registry.channel(channel), envelope, exclude=exclude)
+
+def publish_to_channel(channel, message, exclude=None):
+    """Entregar un mensaje a un canal en este nodo y en el resto del clúster"""
+    envelope = Envelope.wrap(message)
+    delivered = deliver_to_channel(channel, envelope, exclude=exclude)
+    if cluster is not None:
+        cluster.publish(channel, envelope)
+    return delivered
+
+def publish_to_all(message):
+    """Entregar un mensaje a todos los canales de todos los nodos"""
+    envelope = Envelope.wrap(message)
+    delivered = deliver_to_all(envelope)
+    if cluster is not None:
+        cluster.publish(ALL_CHANNELS, envelope)
+    return delivered
+
+def deliver_to_all(envelope):
+    # Canal por canal para que cada historial numere el mensaje
+    return sum(deliver_to_channel(channel, envelope) for channel in registry.channels())
+
+def deliver_to_user(user_id, envelope):
+    # Las conexiones se registran con el id como texto
+    return broadcast(registry.user(str(user_id)), envelope)
+
+def deliver_to_roles(roles, envelope):
+    return broadcast(registry.roles(roles), envelope)
+
+def push_to_user(user_id, message):
+    """Enviar un mensaje a todas las conexiones de un usuario en el clúster"""
+    user_id = str(user_id)
+    envelope = Envelope.wrap(message)
+    if cluster is not None:
+        cluster.publish_direct(f"@user:{user_id}", envelope)
+    return deliver_to_user(user_id, envelope)
+
+def push_to_roles(roles, message):
+    """Enviar un mensaje a todas las conexiones con alguno de los roles en el clúster"""
+    envelope = Envelope.wrap(message)
+    if cluster is not None:
+        cluster.publish_direct("@roles:" + ",".join(roles), envelope)
+    return deliver_to_roles(roles, envelope)
+
+def deliver_relayed(raw):
+    """Entregar a los clientes locales un mensaje retransmitido por otro nodo"""
+    decoded = cluster.decode(raw)
+    if decoded is None:
+        return
+    channel, envelope = decoded
+    if channel.startswith("@user:"):
+        deliver_to_user(channel[len("@user:"):], envelope)
+    elif channel.startswith("@roles:"):
+        deliver_to_roles(channel[len("@roles:"):].split(","), envelope)
+    elif channel == ALL_CHANNELS:
+        deliver_to_all(envelope)
+    else:
+        deliver_to_channel(channel, envelope)
+
+async def relay_redis_message(message):
+    """Distribuir a su canal un mensaje recibido por Redis"""
+    data = json.loads(message["data"])
+    if not isinstance(data, dict):
+        raise ValueError(f"se esperaba un objeto JSON, llegó {type(data).__name__}")
+    channel = data.get("channel", "general")
+    
+    if registry.is_channel(channel):
+        # Enviar a todos los clientes en ese canal, reutilizando el JSON recibido
+        delivered = deliver_to_channel(channel, Envelope(data, payload=message["data"]))
         
-        logger.info("Redis subscriber iniciado")
+        logger.info(f"Mensaje de Redis distribuido a {delivered} clientes en canal {channel}")
+
+async def redis_subscriber():
+    """Suscriptor de Redis para recibir mensajes de otros servicios
+
+    Usa redis.asyncio para no bloquear el event loop. Si la conexión se pierde
+    se reconecta con backoff exponencial y vuelve a suscribirse.
+    """
+    backoff = REDIS_RECONNECT_MIN
+    while True:
+        client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, health_check_interval=30)
+        pubsub = client.pubsub()
+        try:
+            channels = list(REDIS_CHANNELS)
+            if cluster is not None:
+                channels += cluster.subscriptions(registry.channels())
+            await pubsub.subscribe(*channels)
+            subscriber_health.update(connected=True, connected_since=datetime.datetime.now().isoformat())
+            backoff = REDIS_RECONNECT_MIN
+            logger.info("Redis subscriber iniciado")
+            
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                if cluster is not None and cluster.is_relay_message(message["channel"]):
+                    try:
+                        deliver_relayed(message["data"])
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.error(f"Mensaje de relay inválido: {e}")
+                    continue
+                try:
+                    await relay_redis_message(message)
+                    subscriber_health["messages_relayed"] += 1
+                    subscriber_health["last_message_at"] = datetime.datetime.now().isoformat()
+                except (ValueError, TypeError) as e:
+                    logger.error(f"Mensaje de Redis inválido: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en Redis subscriber: {e}. Reintentando en {backoff:.0f}s")
+            subscriber_health.update(connected=False, last_error=str(e))
+            subscriber_health["reconnects"] += 1
+        finally:
+            await pubsub.reset()
+            await client.close()
         
-        for message in pubsub.listen():
-            if message["type"] == "message":
-                data = json.loads(message["data"])
-                channel = data.get("channel", "general")
-                
-                if channel in active_channels:
-                    # Enviar a todos los clientes en ese canal
-                    for client in active_channels[channel]:
-                        await client.send(json.dumps(data))
-                    
-                    logger.info(f"Mensaje de Redis distribuido a {len(active_channels[channel])} clientes en canal {channel}")
-    except Exception as e:
-        logger.error(f"Error en Redis subscriber: {e}")
-        await asyncio.sleep(5)  # Esperar antes de reintentar
-        asyncio.create_task(redis_subscriber())
+        await asyncio.sleep(backoff * random.uniform(0.8, 1.2))  # Esperar antes de reintentar
+        backoff = min(backoff * 2, REDIS_RECONNECT_MAX)
 
-async def fetch_from_api(endpoint):
-    """Obtener datos desde la API de Django"""
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{DJANGO_API_URL}/{endpoint}") as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    logger.error(f"Error al obtener datos de la API: {response.status}")
-                    return None
-    except Exception as e:
-        logger.error(f"Error al conectar con la API: {e}")
+def channel_metrics():
+    """Profundidad de las colas de salida por canal"""
+    metrics = {}
+    for channel, connections in registry.by_channel.items():
+        depths = [len(connection.queue) for connection in connections]
+        metrics[channel] = {
+            "clients": len(depths),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped": sum(connection.dropped for connection in connections),
+        }
+        if channel in batchers:
+            metrics[channel]["batching"] = batchers[channel].stats()
+    return metrics
+
+async def http_handler(path, request_headers):
+    """Responder /health y /metrics por HTTP en el mismo puerto del WebSocket"""
+    if path == "/health":
+        payload = {
+            "status": "healthy" if subscriber_health["connected"] else "degraded",
+            "clients": len(registry),
+            "redis_subscriber": subscriber_health,
+        }
+        if cluster is not None:
+            payload["cluster"] = {
+                "node_id": cluster.node_id,
+                "relay_published": cluster.published,
+                "relay_received": cluster.received,
+                "channel_members": None,
+            }
+            try:
+                payload["cluster"]["channel_members"] = await cluster.member_counts(registry.channels())
+            except Exception as e:
+                logger.warning(f"No se pudo leer la pertenencia del clúster: {e}")
+    elif path == "/metrics":
+        payload = {
+            "channels": channel_metrics(),
+            "reaper": reaper.stats(),
+            "api_client": api_client.stats(),
+        }
+    else:
         return None
+    body = json.dumps(payload).encode("utf-8")
+    return HTTPStatus.OK, [("Content-Type", "application/json")], body
+
+async def fetch_from_api(endpoint):
+    """Obtener datos desde la API de Django (con caché y peticiones coalescidas)"""
+    return await api_client.get(endpoint)
+
+def replay_history(connection, history, last_seq, epoch):
+    """Encolar los mensajes del canal posteriores a ``last_seq``
+
+    Si el hueco ya no está en el historial (o ``epoch`` es de otra numeración)
+    se avisa al cliente para que recupere el estado por la API REST.
+    """
+    missed = history.since(int(last_seq), epoch)
+    if missed is None:
+        connection.send({
+            "type": "system",
+            "action": "history_gap",
+            "channel": history.channel,
+            "last_seq": last_seq,
+            "seq": history.seq,
+            "epoch": history.epoch,
+            "timestamp": datetime.datetime.now().isoformat()
+        })
+        return
+    # Sus propias entradas y salidas (p. ej. al caerse la conexión anterior) no le interesan
+    missed = [
+        envelope for envelope in missed
+        if not (envelope.data.get("action") in ("user_joined", "user_left")
+                and envelope.data.get("client_id") == connection.client_id)
+    ]
+    for envelope in missed:
+        connection.send(envelope)
+    logger.info(f"Reenviados {len(missed)} mensajes de {history.channel} a {connection.client_id}")
 
 async def chat_handler(websocket, path):
     """Manejador principal de WebSocket"""
     client_id = None
     client_channel = "general"
+    connection = None
     
     try:
         # Registro inicial y autenticación
@@ -82,49 +311,68 @@ async def chat_handler(websocket, path):
         client_name = auth_data.get("name", f"Usuario-{client_id[-4:]}")
         client_role = auth_data.get("role", "officer")
         client_channel = auth_data.get("channel", "general")
+        user_id = auth_data.get("user_id")
+        # Codificación de los mensajes: "json" (texto) o "msgpack" (binario)
+        binary = auth_data.get("encoding") == "msgpack" and BINARY_AVAILABLE
         
-        # Registrar cliente
-        connected_clients[client_id] = {
-            "websocket": websocket,
-            "name": client_name,
-            "role": client_role,
-            "connected_at": datetime.datetime.now().isoformat(),
-            "channel": client_channel
-        }
+        # Reanudar: último seq recibido y el epoch del mensaje de bienvenida en que se numeró
+        last_seq = auth_data.get("last_seq")
+        history = histories.get(client_channel)
         
-        # Añadir al canal
-        if client_channel in active_channels:
-            active_channels[client_channel].add(websocket)
+        # Un lote pendiente ya está numerado: enviarlo antes de calcular el hueco
+        if last_seq is not None and client_channel in batchers:
+            batchers[client_channel].flush()
+        
+        # Registrar cliente
+        connection = ClientConnection(websocket, client_id, client_name, client_role, client_channel, user_id,
+                                      binary=binary)
+        registry.add(connection)
         
         # Enviar confirmación
-        await websocket.send(json.dumps({
+        connection.send({
             "type": "system",
             "action": "connected",
             "client_id": client_id,
             "channel": client_channel,
+            "seq": history.seq if history is not None else None,
+            "epoch": history.epoch if history is not None else None,
+            "encoding": "msgpack" if binary else "json",
             "timestamp": datetime.datetime.now().isoformat(),
             "message": f"Bienvenido al sistema de comunicación, {client_name}"
-        }))
+        })
+        
+        # Reenviar lo que el cliente se perdió mientras estaba desconectado
+        if last_seq is not None and history is not None:
+            replay_history(connection, history, last_seq, auth_data.get("epoch"))
+        
+        # Añadir al canal
+        if registry.is_channel(client_channel):
+            if cluster is not None:
+                await cluster.join(client_channel, client_id)
         
         logger.info(f"Cliente {client_name} ({client_id}) conectado al canal {client_channel}")
         
         # Notificar a otros en el mismo canal
-        for client in active_channels[client_channel]:
-            if client != websocket:
-                await client.send(json.dumps({
-                    "type": "system",
-                    "action": "user_joined",
-                    "client_id": client_id,
-                    "name": client_name,
-                    "channel": client_channel,
-                    "timestamp": datetime.datetime.now().isoformat()
-                }))
+        publish_to_channel(client_channel, {
+            "type": "system",
+            "action": "user_joined",
+            "client_id": client_id,
+            "name": client_name,
+            "channel": client_channel,
+            "timestamp": datetime.datetime.now().isoformat()
+        }, exclude=connection)
         
         # Procesar mensajes
         async for message in websocket:
-            data = json.loads(message)
+            connection.touch()
+            data = loads(message, binary)
             msg_type = data.get("type", "message")
             
+            # Latido de aplicación: mantiene viva la conexión con WS_IDLE_TIMEOUT
+            if msg_type == "ping":
+                connection.send({"type": "pong", "timestamp": datetime.datetime.now().isoformat()})
+                continue
+            
             # Añadir metadata
             data.update({
                 "client_id": client_id,
@@ -136,97 +384,192 @@ async def chat_handler(websocket, path):
             # Distribuir mensaje según tipo
             if msg_type == "message":
                 # Mensaje normal al canal
-                for client in active_channels[client_channel]:
-                    await client.send(json.dumps(data))
+                publish_to_channel(client_channel, data)
                     
             elif msg_type == "emergency":
                 # Alerta de emergencia a todos los canales
-                for channel, clients in active_channels.items():
-                    for client in clients:
-                        await client.send(json.dumps(data))
+                publish_to_all(data)
                 
             elif msg_type == "command":
                 # Comando especial
                 command = data.get("command")
                 if command == "switch_channel":
                     new_channel = data.get("params", {}).get("channel", "general")
-                    if new_channel in active_channels:
-                        # Remover del canal actual
-                        active_channels[client_channel].remove(websocket)
+                    if registry.is_channel(new_channel):
+                        # Cambiar de canal en el registro
+                        registry.move(connection, new_channel)
+                        if cluster is not None:
+                            await cluster.leave(client_channel, client_id)
                         
                         # Notificar salida
-                        for client in active_channels[client_channel]:
-                            await client.send(json.dumps({
-                                "type": "system",
-                                "action": "user_left",
-                                "client_id": client_id,
-                                "name": client_name,
-                                "channel": client_channel,
-                                "timestamp": datetime.datetime.now().isoformat()
-                            }))
+                        publish_to_channel(client_channel, {
+                            "type": "system",
+                            "action": "user_left",
+                            "client_id": client_id,
+                            "name": client_name,
+                            "channel": client_channel,
+                            "timestamp": datetime.datetime.now().isoformat()
+                        })
                         
                         # Añadir al nuevo canal
                         client_channel = new_channel
-                        connected_clients[client_id]["channel"] = client_channel
-                        active_channels[client_channel].add(websocket)
+                        if cluster is not None:
+                            await cluster.join(client_channel, client_id)
                         
                         # Notificar al cliente
-                        await websocket.send(json.dumps({
+                        connection.send({
                             "type": "system",
                             "action": "channel_switched",
                             "channel": client_channel,
                             "timestamp": datetime.datetime.now().isoformat()
-                        }))
+                        })
                         
                         # Notificar a otros en el nuevo canal
-                        for client in active_channels[client_channel]:
-                            if client != websocket:
-                                await client.send(json.dumps({
-                                    "type": "system",
-                                    "action": "user_joined",
-                                    "client_id": client_id,
-                                    "name": client_name,
-                                    "channel": client_channel,
-                                    "timestamp": datetime.datetime.now().isoformat()
-                                }))
+                        publish_to_channel(client_channel, {
+                            "type": "system",
+                            "action": "user_joined",
+                            "client_id": client_id,
+                            "name": client_name,
+                            "channel": client_channel,
+                            "timestamp": datetime.datetime.now().isoformat()
+                        }, exclude=connection)
             
             logger.info(f"Mensaje de {client_name} en canal {client_channel}: {msg_type}")
             
-    except websockets.exceptions.ConnectionClosedError:
+    except websockets.exceptions.ConnectionClosedError as e:
+        if connection is not None and e.sent is not None and e.sent.reason == "keepalive ping timeout":
+            reaper.record(connection, "ping_timeout")
         logger.info(f"Conexión cerrada con cliente {client_id}")
     except Exception as e:
         logger.error(f"Error en chat_handler: {e}")
     finally:
         # Limpiar al desconectar
-        if client_id and client_id in connected_clients:
-            del connected_clients[client_id]
+        if connection is not None:
+            connection.close()
+            registry.remove(connection)
         
-        if client_channel in active_channels and websocket in active_channels[client_channel]:
-            active_channels[client_channel].remove(websocket)
+        if connection is not None and registry.is_channel(client_channel):
+            if cluster is not None:
+                await cluster.leave(client_channel, client_id)
             
             # Notificar a otros en el mismo canal
-            for client in active_channels[client_channel]:
-                await client.send(json.dumps({
-                    "type": "system",
-                    "action": "user_left",
-                    "client_id": client_id,
-                    "channel": client_channel,
-                    "timestamp": datetime.datetime.now().isoformat()
-                }))
+            publish_to_channel(client_channel, {
+                "type": "system",
+                "action": "user_left",
+                "client_id": client_id,
+                "channel": client_channel,
+                "timestamp": datetime.datetime.now().isoformat()
+            })
             
         logger.info(f"Cliente {client_id} desconectado del canal {client_channel}")
 
-async def main():
-    """Función principal"""
-    # Iniciar suscriptor de Redis
-    asyncio.create_task(redis_subscriber())
+async def serve(reuse_port=False):
+    """Ejecutar un nodo del servidor WebSocket"""
+    global cluster, history_mirror
+    background = []
+    if CLUSTER_ENABLED:
+        cluster = ClusterRelay(aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0))
+        background += [
+            asyncio.create_task(cluster.run_publisher()),
+            asyncio.create_task(cluster.run_heartbeat()),
+        ]
+        logger.info(f"Modo clúster activo, nodo {cluster.node_id}")
+    
+    if HISTORY_STREAM and histories:
+        history_mirror = HistoryMirror(
+            aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0),
+            node_id=cluster.node_id if cluster is not None else None,
+        )
+        for history in histories.values():
+            try:
+                restored = await history_mirror.load(history)
+                logger.info(f"Historial de {history.channel}: {restored} mensajes recuperados")
+            except Exception as e:
+                logger.error(f"No se pudo cargar el historial de {history.channel}: {e}")
+        background.append(asyncio.create_task(history_mirror.run_writer()))
+    
+    # Iniciar suscriptor de Redis en segundo plano
+    background.append(asyncio.create_task(redis_subscriber()))
+    background.append(asyncio.create_task(reaper.run()))
     
     # Iniciar servidor WebSocket
-    server = await websockets.serve(chat_handler, "0.0.0.0", 8765)
-    logger.info("Servidor WebSocket iniciado en ws://0.0.0.0:8765")
+    extensions = deflate_extensions()
+    server = await websockets.serve(
+        chat_handler, WS_HOST, WS_PORT, process_request=http_handler, reuse_port=reuse_port,
+        extensions=extensions, compression="deflate" if extensions else None,
+        ping_interval=PING_INTERVAL, ping_timeout=PING_TIMEOUT,
+    )
+    logger.info(f"Servidor WebSocket iniciado en ws://{WS_HOST}:{WS_PORT}")
+    # SIGTERM (Kubernetes o el proceso padre): cerrar las conexiones y salir limpiamente
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+    
+    # Iniciar la API HTTP de push
+    push_runner = await start_push_server(
+        create_push_app(push_to_user, push_to_roles), WS_HOST, HTTP_PORT, reuse_port=reuse_port
+    )
     
     # Mantener el servidor ejecutándose
-    await server.wait_closed()
+    try:
+        await server.wait_closed()
+    finally:
+        for task in background:
+            task.cancel()
+        await push_runner.cleanup()
+        await api_client.close()
+        if cluster is not None:
+            await cluster.shutdown()
+
+def run_worker():
+    # Ctrl+C llega a todo el grupo de procesos: lo atiende el padre, que detiene a los workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(serve(reuse_port=True))
+
+def handle_stop(signum, frame):
+    raise KeyboardInterrupt
+
+def stop_workers(workers):
+    """Pedir a los workers que terminen y matar los que no lo hagan a tiempo"""
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    deadline = time.monotonic() + WS_WORKER_STOP_TIMEOUT
+    for worker in workers:
+        worker.join(max(0, deadline - time.monotonic()))
+        if worker.is_alive():
+            logger.warning(f"{worker.name} no terminó en {WS_WORKER_STOP_TIMEOUT:.0f}s, forzando su cierre")
+            worker.kill()
+            worker.join()
+
+def main():
+    """Función principal"""
+    if WS_WORKERS <= 1:
+        asyncio.run(serve())
+        return
+    
+    if not CLUSTER_ENABLED:
+        # Sin retransmisión, cada proceso solo vería a sus propios clientes
+        raise SystemExit("WS_WORKERS > 1 requiere WS_CLUSTER=1")
+    
+    workers = [multiprocessing.Process(target=run_worker, name=f"ws-worker-{i}") for i in range(WS_WORKERS)]
+    for worker in workers:
+        worker.start()
+    # Después de arrancar los workers, para que no hereden el manejador
+    signal.signal(signal.SIGTERM, handle_stop)
+    logger.info(f"{WS_WORKERS} workers compartiendo el puerto {WS_PORT}")
+    try:
+        # Si un worker muere, el resto no debe seguir sirviendo a medias
+        ended = multiprocessing.connection.wait([worker.sentinel for worker in workers])
+        dead = next(worker for worker in workers if worker.sentinel in ended)
+        dead.join()
+        logger.error(f"{dead.name} terminó inesperadamente (código {dead.exitcode}), deteniendo el resto")
+        exit_code = 1
+    except KeyboardInterrupt:
+        logger.info("Deteniendo workers")
+        exit_code = 0
+    finally:
+        stop_workers(workers)
+    if exit_code:
+        raise SystemExit(exit_code)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
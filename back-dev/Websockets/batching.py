@@ -0,0 +1,104 @@
+# batching.py
+# Agrupación de mensajes por canal en ventanas cortas para canales de mucho tráfico
+import asyncio
+import logging
+import os
+
+from broadcast import broadcast
+from connection import presence_key
+from envelope import Envelope
+
+logger = logging.getLogger("websocket_server.batching")
+
+# Canales con agrupación activa, separados por comas (vacío = ninguno)
+BATCH_CHANNELS = [c.strip() for c in os.getenv("WS_BATCH_CHANNELS", "").split(",") if c.strip()]
+# Tiempo máximo que un mensaje espera a que se complete su lote
+BATCH_WINDOW_MS = float(os.getenv("WS_BATCH_WINDOW_MS", 20))
+# Mensajes por lote antes de enviarlo sin esperar a la ventana
+BATCH_MAX_SIZE = int(os.getenv("WS_BATCH_MAX_SIZE", 50))
+
+
+class ChannelBatcher:
+    """Acumula los mensajes de un canal y los envía como un único frame
+
+    El lote sale cuando vence la ventana o cuando llega a ``max_size``
+    mensajes. Un lote de varios mensajes se envía como un array JSON; un
+    mensaje solo se envía tal cual. Los eventos de presencia repetidos del
+    mismo cliente dentro de una ventana se reducen al último.
+    """
+
+    def __init__(self, channel, get_connections, window_ms=BATCH_WINDOW_MS, max_size=BATCH_MAX_SIZE):
+        self.channel = channel
+        self.get_connections = get_connections
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._pending = []
+        self._presence = {}
+        self._size = 0
+        self._timer = None
+        self.batches = 0
+        self.messages = 0
+        self.coalesced = 0
+
+    def add(self, envelope, exclude=None):
+        """Añadir un mensaje al lote en curso"""
+        key = presence_key(envelope)
+        if key is not None:
+            previous = self._presence.get(key)
+            if previous is not None:
+                self._pending[previous] = None
+                self._size -= 1
+                self.coalesced += 1
+            self._presence[key] = len(self._pending)
+
+        self._pending.append((envelope, exclude))
+        self._size += 1
+        if self._size >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """Enviar el lote en curso; devuelve el número de conexiones que lo recibieron"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        entries = [entry for entry in self._pending if entry is not None]
+        self._pending = []
+        self._presence = {}
+        self._size = 0
+        if not entries:
+            return 0
+
+        self.batches += 1
+        self.messages += len(entries)
+        connections = self.get_connections()
+        # Las conexiones excluidas de algún mensaje (p. ej. el propio user_joined)
+        # reciben su propio lote sin esos mensajes
+        excluded = {exclude for _, exclude in entries if exclude is not None}
+        delivered = broadcast(
+            (connection for connection in connections if connection not in excluded),
+            batch_envelope([envelope for envelope, _ in entries]),
+        )
+        for connection in excluded:
+            if connection in connections:
+                own = [envelope for envelope, exclude in entries if exclude is not connection]
+                if own:
+                    delivered += connection.send(batch_envelope(own))
+        return delivered
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "messages": self.messages,
+            "coalesced": self.coalesced,
+            "pending": self._size,
+        }
+
+
+def batch_envelope(envelopes):
+    """Unir varios mensajes en un array JSON reutilizando sus payloads"""
+    if len(envelopes) == 1:
+        return envelopes[0]
+    payload = b"[" + b",".join(envelope.payload for envelope in envelopes) + b"]"
+    return Envelope([envelope.data for envelope in envelopes], payload=payload)
@@ -0,0 +1,116 @@
+# bench_broadcast.py
+# Microbenchmark: CPU por difusión según el tamaño del canal
+#
+#   python benchmarks/bench_broadcast.py --sizes 10 100 1000 5000
+#
+# Compara la serialización por cliente (json.dumps dentro del bucle) con un
+# Envelope serializado una vez, con cada códec, y mide también el camino
+# completo de broadcast() (encolar en cada conexión y vaciar las colas).
+# Los clientes son falsos y no hacen I/O, así que el tiempo medido es solo el
+# coste de CPU del servidor.
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import envelope  # noqa: E402
+from broadcast import broadcast  # noqa: E402
+from connection import ClientConnection  # noqa: E402
+from envelope import Envelope  # noqa: E402
+
+CODECS = {"json": lambda data: json.dumps(data, ensure_ascii=False).encode("utf-8")}
+try:
+    import orjson
+    CODECS["orjson"] = orjson.dumps
+except ImportError:
+    pass
+
+
+class FakeClient:
+    remote_address = ("bench", 0)
+    closed = False
+
+    async def send(self, message):
+        if isinstance(message, str):
+            message.encode("utf-8")
+
+    async def ensure_open(self):
+        pass
+
+    async def write_frame(self, fin, opcode, data):
+        pass
+
+
+def sample_message():
+    return {
+        "type": "message",
+        "text": "Unidad 12 en posición, esperando instrucciones en el sector norte",
+        "client_id": "patrol-unit-0012",
+        "name": "Agente Pérez",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "channel": "operations",
+        "location": {"lat": -12.0464, "lng": -77.0428},
+    }
+
+
+async def per_client_dumps(clients, data):
+    # Comportamiento anterior: json.dumps para cada destinatario
+    for client in clients:
+        await client.send(json.dumps(data))
+
+
+async def envelope_once(clients, data):
+    # Serialización única reutilizada para todos los destinatarios
+    message = Envelope(data)
+    for client in clients:
+        await message.send_to(client)
+
+
+async def broadcast_and_drain(connections, data):
+    broadcast(connections, data)
+    while any(connection.queue for connection in connections):
+        await asyncio.sleep(0)
+
+
+async def measure(fn, clients, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        await fn(clients, sample_message())
+    return (time.process_time() - start) / rounds * 1e6
+
+
+async def run(args):
+    columns = ["json por cliente"]
+    for codec in CODECS:
+        columns += [f"envelope {codec}", f"broadcast {codec}"]
+    print(f"{'clientes':>8}  " + "  ".join(f"{name:>17}" for name in columns) + "   (µs CPU/difusión)")
+
+    for size in args.sizes:
+        clients = [FakeClient() for _ in range(size)]
+        connections = [ClientConnection(client, str(i), "bench", "officer", "operations")
+                       for i, client in enumerate(clients)]
+        rounds = max(1, args.messages // size)
+        results = [await measure(per_client_dumps, clients, rounds)]
+        for dumps in CODECS.values():
+            envelope.dumps = dumps
+            results.append(await measure(envelope_once, clients, rounds))
+            results.append(await measure(broadcast_and_drain, connections, rounds))
+        print(f"{size:>8}  " + "  ".join(f"{value:17.0f}" for value in results))
+        for connection in connections:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU por difusión según tamaño de canal")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--messages", type=int, default=20000, help="envíos totales por medición")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
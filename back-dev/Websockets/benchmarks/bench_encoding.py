@@ -0,0 +1,147 @@
+# bench_encoding.py
+# Microbenchmark: bytes por mensaje y CPU según codificación y permessage-deflate
+#
+#   python benchmarks/bench_encoding.py --messages 5000
+#
+# Pasa una secuencia realista de tráfico de canal (chat, presencia, alertas y
+# notificaciones) por cada combinación de codificación (JSON, MessagePack) y
+# configuración de deflate, con el mismo códec que usa websockets en el
+# servidor y en el cliente. Reporta el tamaño medio en la red, el CPU de
+# compresión en el servidor (por mensaje y por conexión), el CPU de
+# descompresión en el cliente y la memoria de zlib por conexión, para elegir
+# la configuración según el tipo de dispositivo.
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import OP_BINARY, OP_TEXT, Frame
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from envelope import BINARY_AVAILABLE, Envelope  # noqa: E402
+
+# (nombre, ventana en bits, memLevel, reutilizar contexto)
+DEFLATE_CONFIGS = [
+    ("sin compresión", None, None, True),
+    ("deflate w9 m1 sin contexto", 9, 1, False),
+    ("deflate w10 m4", 10, 4, True),
+    ("deflate w12 m5", 12, 5, True),
+    ("deflate w15 m8", 15, 8, True),
+]
+
+NAMES = ["Agente Pérez", "Agente Quispe", "Sargento Rojas", "Teniente Díaz", "Cabo Huamán"]
+TEXTS = [
+    "Unidad en posición, esperando instrucciones en el sector norte",
+    "Vehículo sospechoso detenido en Av. Arequipa con Javier Prado",
+    "Solicito apoyo, dos sujetos huyendo a pie hacia el parque",
+    "Copiado, me dirijo al punto",
+    "Sin novedad en el perímetro",
+    "Ambulancia en camino, tiempo estimado 6 minutos",
+]
+
+
+def traffic(count, seed=7):
+    """Secuencia de mensajes con la proporción típica de un canal de operaciones"""
+    rng = random.Random(seed)
+    now = datetime.datetime(2024, 5, 1, 8, 0, 0)
+    seq = 0
+    for _ in range(count):
+        seq += 1
+        now += datetime.timedelta(milliseconds=rng.randint(50, 3000))
+        unit = rng.randint(1, 80)
+        base = {
+            "client_id": f"patrol-unit-{unit:04d}",
+            "name": rng.choice(NAMES),
+            "channel": "operations",
+            "timestamp": now.isoformat(),
+            "seq": seq,
+        }
+        kind = rng.random()
+        if kind < 0.65:
+            yield {"type": "message", "text": rng.choice(TEXTS), **base,
+                   "location": {"lat": round(-12.04 - rng.random() / 10, 6),
+                                "lng": round(-77.02 - rng.random() / 10, 6)}}
+        elif kind < 0.85:
+            yield {"type": "system", "action": rng.choice(["user_joined", "user_left"]), **base}
+        elif kind < 0.95:
+            yield {"type": "notification", "data": {"title": "Caso asignado",
+                   "case_number": f"CASE-{rng.randint(1000, 9999)}", "priority": "alta"},
+                   "timestamp": base["timestamp"], "seq": seq}
+        else:
+            yield {"type": "emergency", "text": "Oficial requiere apoyo inmediato", **base,
+                   "location": {"lat": -12.0464, "lng": -77.0428}}
+
+
+def zlib_memory(window_bits, mem_level):
+    # Fórmulas de zlib (zconf.h): compresor en el servidor, descompresor en el cliente
+    return (1 << (window_bits + 2)) + (1 << (mem_level + 9)), (1 << window_bits) + 7 * 1024
+
+
+def measure(payloads, opcode, window_bits, mem_level, context_takeover):
+    """Devolver (bytes medios, µs compresión, µs descompresión) por mensaje"""
+    if window_bits is None:
+        return sum(len(p) for p in payloads) / len(payloads), 0.0, 0.0
+
+    no_context = not context_takeover
+    server = PerMessageDeflate(no_context, no_context, window_bits, window_bits,
+                               {"memLevel": mem_level})
+    client = PerMessageDeflate(no_context, no_context, window_bits, window_bits)
+
+    start = time.process_time()
+    frames = [server.encode(Frame(opcode, payload)) for payload in payloads]
+    encode_us = (time.process_time() - start) / len(payloads) * 1e6
+
+    start = time.process_time()
+    for frame in frames:
+        client.decode(frame)
+    decode_us = (time.process_time() - start) / len(payloads) * 1e6
+
+    return sum(len(frame.data) for frame in frames) / len(frames), encode_us, decode_us
+
+
+def frame_overhead(size):
+    # Cabecera de un frame servidor -> cliente (sin máscara)
+    return 2 if size < 126 else 4
+
+
+def run(args):
+    messages = [Envelope(data) for data in traffic(args.messages)]
+    encodings = [("json", OP_TEXT, [m.payload for m in messages])]
+    if BINARY_AVAILABLE:
+        encodings.append(("msgpack", OP_BINARY, [m.binary_payload for m in messages]))
+    else:
+        print("msgpack no está instalado: solo se mide JSON\n")
+
+    raw_json = sum(len(p) for p in encodings[0][2]) / len(messages)
+    print(f"{args.messages} mensajes, JSON sin comprimir: {raw_json:.0f} bytes/mensaje\n")
+    print(f"{'codificación':<9} {'configuración':<28} {'bytes/msg':>9} {'vs json':>8} "
+          f"{'µs srv/conn':>11} {'µs cliente':>10} {'mem srv':>8} {'mem cli':>8}")
+
+    for name, opcode, payloads in encodings:
+        for label, window_bits, mem_level, context_takeover in DEFLATE_CONFIGS:
+            size, encode_us, decode_us = measure(payloads, opcode, window_bits, mem_level, context_takeover)
+            size += frame_overhead(size)
+            if window_bits is None:
+                mem_server = mem_client = "-"
+            else:
+                server_bytes, client_bytes = zlib_memory(window_bits, mem_level)
+                mem_server, mem_client = f"{server_bytes // 1024}K", f"{client_bytes // 1024}K"
+            print(f"{name:<9} {label:<28} {size:9.0f} {size / raw_json:7.0%} "
+                  f"{encode_us:11.1f} {decode_us:10.1f} {mem_server:>8} {mem_client:>8}")
+
+    print("\nCon permessage-deflate la compresión se hace por conexión: el CPU del")
+    print("servidor por difusión es 'µs srv/conn' multiplicado por los destinatarios.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes y CPU por mensaje según codificación y compresión")
+    parser.add_argument("--messages", type=int, default=5000)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
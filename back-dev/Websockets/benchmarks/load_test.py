@@ -0,0 +1,275 @@
+# load_test.py
+# Prueba de carga: miles de clientes WebSocket hablando el protocolo real
+#
+#   python benchmarks/load_test.py --spawn --clients 2000 --senders 200 --duration 30
+#   python benchmarks/load_test.py --url ws://localhost:8765 --server-pid 1234
+#
+# Con --spawn arranca un Redis local de prueba (fakeredis, o el servidor
+# indicado con --redis-port) y una instancia de app.py, así la prueba no
+# depende de ningún servicio externo. Cada cliente se autentica, se queda en
+# un canal y recibe; los emisores envían una mezcla configurable de mensajes
+# de chat, emergencias y cambios de canal.
+#
+# Reporta la velocidad de conexión, la latencia de difusión (desde que el
+# emisor envía hasta que cada receptor recibe) en p50/p99, los mensajes por
+# segundo enviados y entregados, y la memoria (RSS) del servidor. Todos los
+# clientes viven en este proceso: con muchos miles, comprobar que el CPU del
+# generador no es el cuello de botella.
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import websockets
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CHANNELS = ["general", "operations", "emergency", "admin"]
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.connect_failures = 0
+        self.sent = {"message": 0, "emergency": 0, "switch_channel": 0}
+        self.delivered = 0
+        self.latencies = []
+        self.errors = 0
+        self.rss_samples = []
+
+
+def parse_mix(text):
+    """Convertir "message=90,emergency=1,switch_channel=9" en pesos"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {"message", "emergency", "switch_channel"}
+    if unknown:
+        raise SystemExit(f"Tipos desconocidos en --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def server_rss(pid):
+    """RSS del proceso en MB (solo Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def record_deliveries(stats, message):
+    now = time.perf_counter()
+    data = json.loads(message)
+    # Los canales con agrupación entregan arrays de mensajes
+    for item in data if isinstance(data, list) else (data,):
+        sent_at = item.get("bench_sent_at")
+        if sent_at is not None:
+            stats.delivered += 1
+            stats.latencies.append(now - sent_at)
+
+
+async def connect_client(args, index, stats):
+    channel = random.choices(CHANNELS, weights=args.channel_weights)[0]
+    try:
+        websocket = await websockets.connect(
+            args.url, ping_interval=None, open_timeout=args.connect_timeout,
+            compression="deflate" if args.compression else None,
+        )
+        await websocket.send(json.dumps({
+            "client_id": f"load-{index}",
+            "name": f"Carga {index}",
+            "role": random.choice(["officer", "officer", "officer", "supervisor", "admin"]),
+            "channel": channel,
+        }))
+        await websocket.recv()
+    except Exception:
+        stats.connect_failures += 1
+        return None
+    stats.connected += 1
+    return websocket
+
+
+async def receive_loop(websocket, stats):
+    try:
+        async for message in websocket:
+            record_deliveries(stats, message)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    except Exception:
+        stats.errors += 1
+
+
+async def send_loop(websocket, args, mix, stats, deadline):
+    kinds, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        # Llegadas de Poisson con la tasa configurada por emisor
+        await asyncio.sleep(random.expovariate(args.rate))
+        kind = random.choices(kinds, weights=weights)[0]
+        if kind == "switch_channel":
+            payload = {"type": "command", "command": "switch_channel",
+                       "params": {"channel": random.choice(CHANNELS)}}
+        else:
+            payload = {"type": kind, "text": "Unidad en posición, esperando instrucciones",
+                       "bench_sent_at": time.perf_counter()}
+        try:
+            await websocket.send(json.dumps(payload))
+        except websockets.exceptions.ConnectionClosed:
+            stats.errors += 1
+            return
+        stats.sent[kind] += 1
+
+
+async def sample_rss(pid, stats, deadline):
+    while time.perf_counter() < deadline:
+        rss = server_rss(pid)
+        if rss is not None:
+            stats.rss_samples.append(rss)
+        await asyncio.sleep(0.5)
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else float("nan")
+
+
+async def run_load(args, server_pid):
+    stats = Stats()
+    mix = parse_mix(args.mix)
+    rss_before = server_rss(server_pid) if server_pid else None
+
+    # Conexión escalonada con un máximo de handshakes simultáneos
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+    async def limited(index):
+        async with semaphore:
+            return await connect_client(args, index, stats)
+
+    started = time.perf_counter()
+    clients = [c for c in await asyncio.gather(*(limited(i) for i in range(args.clients))) if c]
+    connect_seconds = time.perf_counter() - started
+    rss_connected = server_rss(server_pid) if server_pid else None
+
+    receivers = [asyncio.create_task(receive_loop(client, stats)) for client in clients]
+    deadline = time.perf_counter() + args.duration
+    measure_started = time.perf_counter()
+    tasks = [send_loop(client, args, mix, stats, deadline) for client in clients[:args.senders]]
+    if server_pid:
+        tasks.append(sample_rss(server_pid, stats, deadline))
+    await asyncio.gather(*tasks)
+    # Dar tiempo a que lleguen las últimas difusiones
+    await asyncio.sleep(args.drain)
+    elapsed = time.perf_counter() - measure_started
+
+    await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+    for receiver in receivers:
+        receiver.cancel()
+
+    latencies = sorted(stats.latencies)
+    sent = sum(stats.sent.values())
+    print(f"Clientes:            {stats.connected} conectados, {stats.connect_failures} fallidos")
+    print(f"Conexión:            {stats.connected / connect_seconds:.0f} conexiones/s ({connect_seconds:.1f}s)")
+    print(f"Enviados:            {sent} ({', '.join(f'{k}={v}' for k, v in stats.sent.items())})")
+    print(f"Enviados/s:          {sent / elapsed:.0f}")
+    print(f"Entregados/s:        {stats.delivered / elapsed:.0f} ({stats.delivered} entregas)")
+    print(f"Latencia difusión:   p50 {percentile(latencies, 0.50):.1f} ms, "
+          f"p99 {percentile(latencies, 0.99):.1f} ms, máx {percentile(latencies, 1.0):.1f} ms")
+    print(f"Errores:             {stats.errors}")
+    peak = max(stats.rss_samples, default=None)
+    if peak is not None and rss_before is not None:
+        print(f"RSS servidor:        antes {rss_before:.0f} MB, conectados {rss_connected:.0f} MB, "
+              f"pico {peak:.0f} MB")
+    elif server_pid:
+        print("RSS servidor:        n/d (solo Linux)")
+
+
+def wait_for_port(host, port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"Nada escucha en {host}:{port} tras {timeout:.0f}s")
+
+
+def spawn_stack(args):
+    """Arrancar un Redis de prueba (si hace falta) y el servidor WebSocket"""
+    processes = []
+    redis_port = args.redis_port
+    if redis_port is None:
+        redis_port = 6390
+        code = ("from fakeredis import TcpFakeServer; "
+                f"TcpFakeServer(('127.0.0.1', {redis_port}), server_type='redis').serve_forever()")
+        processes.append(subprocess.Popen([sys.executable, "-c", code]))
+        wait_for_port("127.0.0.1", redis_port)
+
+    env = {
+        **os.environ,
+        "REDIS_HOST": "127.0.0.1",
+        "REDIS_PORT": str(redis_port),
+        "WS_HOST": "127.0.0.1",
+        "WS_PORT": str(args.port),
+        "HTTP_PORT": str(args.port + 1),
+    }
+    log = open(os.devnull, "w") if not args.server_log else open(args.server_log, "w")
+    server = subprocess.Popen([sys.executable, "app.py"], cwd=APP_DIR, env=env, stdout=log, stderr=log)
+    processes.append(server)
+    wait_for_port("127.0.0.1", args.port)
+    return server.pid, processes
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor WebSocket")
+    parser.add_argument("--url", default=None, help="servidor existente (por defecto el arrancado con --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="arrancar app.py y un Redis de prueba")
+    parser.add_argument("--port", type=int, default=8790, help="puerto WebSocket del servidor arrancado")
+    parser.add_argument("--redis-port", type=int, default=None, help="Redis real en lugar de fakeredis")
+    parser.add_argument("--server-pid", type=int, default=None, help="pid del servidor para medir RSS")
+    parser.add_argument("--server-log", default=None, help="guardar la salida del servidor arrancado")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--senders", type=int, default=100, help="clientes que además envían")
+    parser.add_argument("--rate", type=float, default=1.0, help="mensajes/s por emisor")
+    parser.add_argument("--mix", default="message=90,emergency=1,switch_channel=9")
+    parser.add_argument("--channel-weights", type=float, nargs=4, default=[40, 40, 10, 10],
+                        metavar=("GENERAL", "OPERATIONS", "EMERGENCY", "ADMIN"))
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--drain", type=float, default=2.0, help="espera final para entregas pendientes")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--connect-timeout", type=float, default=10.0)
+    parser.add_argument("--compression", action="store_true", help="negociar permessage-deflate")
+    args = parser.parse_args()
+
+    if not args.spawn and not args.url:
+        parser.error("indicar --url o --spawn")
+    raise_fd_limit()
+    processes = []
+    server_pid = args.server_pid
+    if args.spawn:
+        server_pid, processes = spawn_stack(args)
+        args.url = args.url or f"ws://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(run_load(args, server_pid))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# broadcast.py
+# Difusión de mensajes a los clientes de los canales
+import logging
+
+from envelope import Envelope
+
+logger = logging.getLogger("websocket_server.broadcast")
+
+
+def broadcast(connections, message, exclude=None):
+    """Encolar un mensaje (dict o Envelope) para todas las conexiones
+
+    El mensaje se serializa una sola vez y cada conexión lo envía desde su
+    propia tarea escritora, así que difundir no espera a ningún socket.
+    Devuelve el número de conexiones que lo aceptaron en su cola.
+    """
+    envelope = Envelope.wrap(message)
+    # Copia del conjunto: encolar puede desconectar clientes (política disconnect)
+    targets = [connection for connection in connections if connection is not exclude]
+    delivered = sum(connection.send(envelope) for connection in targets)
+    if delivered < len(targets):
+        logger.info(f"Difusión encolada para {delivered}/{len(targets)} clientes")
+    return delivered
@@ -0,0 +1,184 @@
+# cluster.py
+# Modo distribuido: varios procesos/pods comparten canales a través de Redis
+#
+# Cada nodo (proceso) es dueño de sus conexiones. La pertenencia a canales se
+# registra en Redis y los mensajes de canal se retransmiten por pub/sub a los
+# demás nodos, que los entregan a sus clientes locales.
+import asyncio
+import collections
+import json
+import logging
+import os
+import socket
+
+from envelope import Envelope
+
+logger = logging.getLogger("websocket_server.cluster")
+
+CLUSTER_ENABLED = os.getenv("WS_CLUSTER", "0") == "1"
+RELAY_PREFIX = "ws:relay:"
+ALL_CHANNELS = "*"
+# Destino de los mensajes dirigidos a usuarios o roles ("@user:<id>", "@roles:<r1>,<r2>")
+DIRECT = "@direct"
+NODES_KEY = "ws:nodes"
+NODE_TTL = int(os.getenv("WS_NODE_TTL", 30))
+# Mensajes publicados por viaje a Redis
+PUBLISH_BATCH = int(os.getenv("WS_RELAY_PUBLISH_BATCH", 100))
+
+
+def default_node_id():
+    # Se calcula en cada proceso (no al importar) para que los workers
+    # creados con fork tengan ids distintos
+    return os.getenv("WS_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def relay_channel(channel):
+    return f"{RELAY_PREFIX}{channel}"
+
+
+def members_key(channel):
+    return f"ws:channel:{channel}:members"
+
+
+def node_members_key(node_id):
+    return f"ws:node:{node_id}:members"
+
+
+def node_alive_key(node_id):
+    return f"ws:node:{node_id}:alive"
+
+
+class ClusterRelay:
+    """Retransmisión de mensajes de canal y pertenencia compartida entre nodos
+
+    El mensaje de relay es una cabecera JSON, un salto de línea y el payload
+    original, que se reenvía a los clientes sin volver a serializarlo.
+    """
+
+    def __init__(self, redis_client, node_id=None):
+        self.redis = redis_client
+        self.node_id = node_id or default_node_id()
+        self._outbox = collections.deque()
+        self._waiter = None
+        self.published = 0
+        self.received = 0
+
+    def subscriptions(self, channels):
+        """Canales de pub/sub a los que debe suscribirse este nodo"""
+        return [relay_channel(channel) for channel in channels] + [
+            relay_channel(ALL_CHANNELS), relay_channel(DIRECT)
+        ]
+
+    def is_relay_message(self, pubsub_channel):
+        if isinstance(pubsub_channel, bytes):
+            pubsub_channel = pubsub_channel.decode("utf-8")
+        return pubsub_channel.startswith(RELAY_PREFIX)
+
+    def publish(self, channel, envelope):
+        """Encolar un mensaje para los demás nodos (``ALL_CHANNELS`` para todos los canales)"""
+        self._outbox.append((channel, channel, envelope))
+        self._wake()
+
+    def publish_direct(self, target, envelope):
+        """Encolar un mensaje dirigido (``@user:<id>`` o ``@roles:<r1>,<r2>``) para los demás nodos"""
+        self._outbox.append((DIRECT, target, envelope))
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def decode(self, raw):
+        """Devolver (canal, Envelope) de un mensaje de relay, o None si es propio"""
+        header, _, payload = raw.partition(b"\n")
+        header = json.loads(header)
+        if header["origin"] == self.node_id:
+            return None
+        self.received += 1
+        return header["channel"], Envelope(json.loads(payload), payload=payload)
+
+    async def run_publisher(self):
+        """Publicar los mensajes encolados en lotes con pipeline"""
+        while True:
+            if not self._outbox:
+                self._waiter = asyncio.get_running_loop().create_future()
+                await self._waiter
+                self._waiter = None
+
+            batch = [self._outbox.popleft() for _ in range(min(len(self._outbox), PUBLISH_BATCH))]
+            pipe = self.redis.pipeline(transaction=False)
+            for pubsub_channel, target, envelope in batch:
+                header = json.dumps({"origin": self.node_id, "channel": target}).encode("utf-8")
+                pipe.publish(relay_channel(pubsub_channel), header + b"\n" + envelope.payload)
+            try:
+                await pipe.execute()
+                self.published += len(batch)
+            except Exception as e:
+                logger.error(f"No se pudieron retransmitir {len(batch)} mensajes: {e}")
+                await asyncio.sleep(1)
+
+    async def join(self, channel, client_id):
+        member = f"{self.node_id}:{client_id}"
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.sadd(members_key(channel), member)
+            pipe.sadd(node_members_key(self.node_id), f"{channel}|{member}")
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"No se pudo registrar {client_id} en {channel}: {e}")
+
+    async def leave(self, channel, client_id):
+        member = f"{self.node_id}:{client_id}"
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.srem(members_key(channel), member)
+            pipe.srem(node_members_key(self.node_id), f"{channel}|{member}")
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"No se pudo quitar {client_id} de {channel}: {e}")
+
+    async def member_counts(self, channels):
+        """Miembros de cada canal en todo el clúster, en un solo viaje a Redis"""
+        pipe = self.redis.pipeline(transaction=False)
+        for channel in channels:
+            pipe.scard(members_key(channel))
+        return dict(zip(channels, await pipe.execute()))
+
+    async def run_heartbeat(self):
+        """Anunciar que este nodo sigue vivo y limpiar la pertenencia de nodos caídos"""
+        while True:
+            try:
+                await self.redis.set(node_alive_key(self.node_id), 1, ex=NODE_TTL)
+                await self.redis.sadd(NODES_KEY, self.node_id)
+                await self._reap_dead_nodes()
+            except Exception as e:
+                logger.error(f"Error en heartbeat del nodo {self.node_id}: {e}")
+            await asyncio.sleep(NODE_TTL / 3)
+
+    async def _reap_dead_nodes(self):
+        for node_id in await self.redis.smembers(NODES_KEY):
+            if isinstance(node_id, bytes):
+                node_id = node_id.decode("utf-8")
+            if node_id != self.node_id and not await self.redis.exists(node_alive_key(node_id)):
+                removed = await self._remove_node(node_id)
+                logger.info(f"Nodo {node_id} caído: {removed} miembros eliminados")
+
+    async def _remove_node(self, node_id):
+        entries = await self.redis.smembers(node_members_key(node_id))
+        pipe = self.redis.pipeline(transaction=False)
+        for entry in entries:
+            if isinstance(entry, bytes):
+                entry = entry.decode("utf-8")
+            channel, _, member = entry.partition("|")
+            pipe.srem(members_key(channel), member)
+        pipe.delete(node_members_key(node_id), node_alive_key(node_id))
+        pipe.srem(NODES_KEY, node_id)
+        await pipe.execute()
+        return len(entries)
+
+    async def shutdown(self):
+        """Retirar la pertenencia de este nodo al apagarse"""
+        try:
+            await self._remove_node(self.node_id)
+        except Exception as e:
+            logger.error(f"No se pudo retirar el nodo {self.node_id}: {e}")
@@ -0,0 +1,39 @@
+# compression.py
+# Configuración de permessage-deflate para el servidor WebSocket
+import logging
+import os
+
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+logger = logging.getLogger("websocket_server.compression")
+
+# "deflate" negocia permessage-deflate con los clientes que lo ofrecen; "none" lo desactiva
+COMPRESSION = os.getenv("WS_COMPRESSION", "deflate")
+# Ventana de compresión del servidor (9-15). Con mensajes de menos de 1 KB,
+# 2^12 bytes ya cubren varios mensajes seguidos y zlib usa ~32 KB por conexión
+SERVER_MAX_WINDOW_BITS = int(os.getenv("WS_DEFLATE_SERVER_MAX_WINDOW_BITS", 12))
+# Ventana que se pide al cliente para lo que envía (limita la memoria del móvil)
+CLIENT_MAX_WINDOW_BITS = int(os.getenv("WS_DEFLATE_CLIENT_MAX_WINDOW_BITS", 12))
+# Memoria interna de zlib (1-9) y nivel de compresión (1-9)
+MEM_LEVEL = int(os.getenv("WS_DEFLATE_MEM_LEVEL", 5))
+COMPRESSION_LEVEL = int(os.getenv("WS_DEFLATE_LEVEL", 6))
+# Sin reutilizar el contexto entre mensajes se ahorra memoria pero se pierde
+# casi toda la ganancia sobre las claves repetidas
+NO_CONTEXT_TAKEOVER = os.getenv("WS_DEFLATE_NO_CONTEXT_TAKEOVER", "0") == "1"
+
+
+def deflate_extensions():
+    """Extensiones para ``websockets.serve`` (None si la compresión está desactivada)"""
+    if COMPRESSION == "none":
+        return None
+    if COMPRESSION != "deflate":
+        logger.warning(f"WS_COMPRESSION={COMPRESSION} desconocido, usando deflate")
+    return [
+        ServerPerMessageDeflateFactory(
+            server_no_context_takeover=NO_CONTEXT_TAKEOVER,
+            client_no_context_takeover=NO_CONTEXT_TAKEOVER,
+            server_max_window_bits=SERVER_MAX_WINDOW_BITS,
+            client_max_window_bits=CLIENT_MAX_WINDOW_BITS,
+            compress_settings={"memLevel": MEM_LEVEL, "level": COMPRESSION_LEVEL},
+        )
+    ]
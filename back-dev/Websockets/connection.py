@@ -0,0 +1,164 @@
+# connection.py
+# Conexión de cliente con cola de salida acotada y tarea escritora propia
+import asyncio
+import collections
+import datetime
+import logging
+import os
+import time
+
+import websockets
+
+from envelope import Envelope
+
+logger = logging.getLogger("websocket_server.connection")
+
+# Tiempo máximo que puede tardar un envío a un cliente
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 5.0))
+# Mensajes pendientes por cliente antes de aplicar la política de desborde
+MAX_QUEUE_SIZE = int(os.getenv("WS_MAX_QUEUE_SIZE", 256))
+# Política de desborde: drop_oldest, coalesce o disconnect
+QUEUE_POLICY = os.getenv("WS_QUEUE_POLICY", "coalesce")
+
+PRESENCE_ACTIONS = ("user_joined", "user_left")
+URGENT_TYPES = ("emergency",)
+
+
+def is_urgent(envelope):
+    # Los lotes (listas) nunca contienen mensajes urgentes
+    return isinstance(envelope.data, dict) and envelope.data.get("type") in URGENT_TYPES
+
+
+def presence_key(envelope):
+    """Clave (cliente, canal) de un evento de presencia, o None si no lo es"""
+    data = envelope.data
+    if isinstance(data, dict) and data.get("type") == "system" and data.get("action") in PRESENCE_ACTIONS:
+        return data.get("client_id"), data.get("channel")
+    return None
+
+
+class ClientConnection:
+    """Cliente conectado con su cola de salida
+
+    Los difusores solo encolan (O(1), sin esperar al socket) y cada conexión
+    tiene una tarea que vacía su cola. Un cliente lento solo retrasa su propia
+    cola; cuando se llena se aplica la política configurada.
+    """
+
+    __slots__ = (
+        "websocket", "client_id", "user_id", "name", "role", "channel", "connected_at", "last_seen",
+        "binary", "max_queue", "policy", "queue", "dropped", "closed", "send_started",
+        "_waiter", "_writer", "__weakref__",
+    )
+
+    def __init__(self, websocket, client_id, name, role, channel, user_id=None,
+                 binary=False, max_queue=MAX_QUEUE_SIZE, policy=QUEUE_POLICY):
+        self.websocket = websocket
+        self.client_id = client_id
+        # Siempre texto: la API de push busca al usuario con el id de la URL
+        self.user_id = str(client_id if user_id in (None, "") else user_id)
+        self.name = name
+        self.role = role
+        self.channel = channel
+        self.connected_at = datetime.datetime.now().isoformat()
+        # Última vez (monotonic) que el cliente envió algo
+        self.last_seen = time.monotonic()
+        # True si el cliente pidió MessagePack en lugar de JSON
+        self.binary = binary
+        self.max_queue = max_queue
+        self.policy = policy
+        self.queue = collections.deque()
+        self.dropped = 0
+        self.closed = False
+        self.send_started = None
+        self._waiter = None
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message):
+        """Encolar un mensaje (dict o Envelope); devuelve False si se descartó"""
+        envelope = Envelope.wrap(message)
+        if self.closed:
+            return False
+        if len(self.queue) >= self.max_queue and not self._make_room(envelope):
+            return False
+        self.queue.append(envelope)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        return True
+
+    def _make_room(self, envelope):
+        """Aplicar la política de desborde; devuelve True si cabe el nuevo mensaje"""
+        if self.policy == "disconnect":
+            logger.warning(f"Cola llena para {self.client_id}, desconectando")
+            self.close(code=1013, reason="outbound queue overflow")
+            return False
+
+        if self.policy == "coalesce":
+            # Un evento de presencia nuevo reemplaza al anterior del mismo cliente y canal
+            key = presence_key(envelope)
+            if key is not None:
+                for queued in self.queue:
+                    if presence_key(queued) == key:
+                        self.queue.remove(queued)
+                        self.dropped += 1
+                        return True
+
+        # Descartar el mensaje no urgente más antiguo
+        for queued in self.queue:
+            if not is_urgent(queued):
+                self.queue.remove(queued)
+                self.dropped += 1
+                return True
+
+        # Cola llena solo de mensajes urgentes: se descarta el nuevo si no es urgente
+        if not is_urgent(envelope):
+            self.dropped += 1
+            return False
+        self.queue.popleft()
+        self.dropped += 1
+        return True
+
+    async def _write_loop(self):
+        while True:
+            if not self.queue:
+                self._waiter = asyncio.get_running_loop().create_future()
+                await self._waiter
+                self._waiter = None
+            while self.queue:
+                envelope = self.queue.popleft()
+                # El plazo lo vigila ConnectionReaper: un timeout por envío
+                # costaría más CPU que el propio envío
+                self.send_started = time.monotonic()
+                try:
+                    await envelope.send_to(self.websocket, self.binary)
+                except websockets.exceptions.ConnectionClosed:
+                    self.closed = True
+                    return
+                except Exception as e:
+                    logger.error(f"Error enviando a {self.client_id}: {e}")
+                finally:
+                    self.send_started = None
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def send_stalled(self, now):
+        return self.send_started is not None and now - self.send_started > SEND_TIMEOUT
+
+    def close(self, code=1000, reason=""):
+        """Detener la escritura y cerrar el socket"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if not self.websocket.closed:
+            asyncio.create_task(self._close_socket(code, reason))
+
+    async def _close_socket(self, code, reason):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception as e:
+            logger.debug(f"Error cerrando el socket de {self.client_id}: {e}")
+
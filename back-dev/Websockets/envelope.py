@@ -0,0 +1,91 @@
+# envelope.py
+# Mensajes serializados una sola vez por difusión
+import json
+import logging
+import os
+
+from websockets.frames import OP_BINARY, OP_TEXT
+
+logger = logging.getLogger("websocket_server.envelope")
+
+# Códec JSON: "json" (biblioteca estándar) u "orjson" si está instalado
+JSON_CODEC = os.getenv("WS_JSON_CODEC", "json")
+
+if JSON_CODEC == "orjson":
+    try:
+        import orjson
+    except ImportError:
+        logger.warning("WS_JSON_CODEC=orjson pero orjson no está instalado, usando json")
+        JSON_CODEC = "json"
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(data)
+
+
+def _json_dumps(data):
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+dumps = _orjson_dumps if JSON_CODEC == "orjson" else _json_dumps
+
+# Codificación binaria opcional (MessagePack) que el cliente elige al autenticarse
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BINARY_AVAILABLE = msgpack is not None
+
+
+def loads(raw, binary=False):
+    """Decodificar un mensaje entrante (frame binario MessagePack o texto JSON)"""
+    if binary and isinstance(raw, bytes):
+        return msgpack.unpackb(raw)
+    return json.loads(raw)
+
+
+class Envelope:
+    """Mensaje a difundir con su serialización en caché
+
+    ``payload`` (JSON) y ``binary_payload`` (MessagePack) se calculan la
+    primera vez que se piden y se reutilizan para todos los destinatarios.
+    """
+
+    __slots__ = ("data", "_payload", "_binary_payload")
+
+    def __init__(self, data, payload=None):
+        self.data = data
+        self._payload = payload
+        self._binary_payload = None
+
+    @classmethod
+    def wrap(cls, message):
+        return message if isinstance(message, cls) else cls(message)
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            self._payload = dumps(self.data)
+        return self._payload
+
+    @property
+    def binary_payload(self):
+        if self._binary_payload is None:
+            self._binary_payload = msgpack.packb(self.data)
+        return self._binary_payload
+
+    async def send_to(self, client, binary=False):
+        """Enviar el payload como frame de texto (o binario) sin volver a codificarlo"""
+        if binary:
+            if hasattr(client, "write_frame"):
+                await client.ensure_open()
+                await client.write_frame(True, OP_BINARY, self.binary_payload)
+            else:
+                await client.send(self.binary_payload)
+        elif hasattr(client, "write_frame"):
+            # Equivale a client.send(str) sin la conversión str -> UTF-8 por cliente
+            await client.ensure_open()
+            await client.write_frame(True, OP_TEXT, self.payload)
+        else:
+            await client.send(self.payload.decode("utf-8"))
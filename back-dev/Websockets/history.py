@@ -0,0 +1,138 @@
+# history.py
+# Historial acotado por canal con números de secuencia para reanudar tras reconectar
+import asyncio
+import collections
+import json
+import logging
+import os
+import uuid
+
+from envelope import Envelope
+
+logger = logging.getLogger("websocket_server.history")
+
+# Mensajes que se guardan por canal (0 desactiva el historial)
+HISTORY_SIZE = int(os.getenv("WS_HISTORY_SIZE", 500))
+# Replicar el historial en Redis Streams para conservarlo al reiniciar
+HISTORY_STREAM = os.getenv("WS_HISTORY_STREAM", "0") == "1"
+# Entradas escritas por viaje a Redis
+HISTORY_WRITE_BATCH = int(os.getenv("WS_HISTORY_WRITE_BATCH", 100))
+
+
+def stream_key(channel, node_id=None):
+    # En modo clúster cada nodo numera sus propios mensajes
+    if node_id:
+        return f"ws:history:{node_id}:{channel}"
+    return f"ws:history:{channel}"
+
+
+def new_epoch():
+    return uuid.uuid4().hex[:12]
+
+
+def stamp(envelope, seq):
+    """Copia de un mensaje con su ``seq``, reutilizando el JSON ya serializado"""
+    data = {**envelope.data, "seq": seq}
+    body = envelope.payload.rstrip()
+    if "seq" in envelope.data or not body.endswith(b"}"):
+        return Envelope(data)
+    # Añadir el campo antes de la llave final en lugar de volver a serializar
+    head = body[:-1].rstrip()
+    separator = b"" if head.endswith(b"{") else b","
+    return Envelope(data, payload=head + separator + b'"seq":%d}' % seq)
+
+
+class ChannelHistory:
+    """Últimos mensajes de un canal en un buffer circular
+
+    Cada mensaje recibe un ``seq`` creciente. Los números solo valen dentro de
+    una numeración, identificada por ``epoch``: cada proceso empieza la suya
+    (salvo que recupere el historial de Redis, que trae la suya). Un cliente
+    que reconecta envía el último ``seq`` que vio y el ``epoch`` en que lo vio,
+    y recibe solo los mensajes posteriores; si el ``epoch`` no coincide (otro
+    worker u otro nodo, o un reinicio sin historial) no hay forma de saber qué
+    se perdió y se trata como un hueco.
+    """
+
+    def __init__(self, channel, size=HISTORY_SIZE):
+        self.channel = channel
+        self.entries = collections.deque(maxlen=size)
+        self.seq = 0
+        self.epoch = new_epoch()
+
+    def record(self, envelope):
+        """Numerar un mensaje y guardarlo; devuelve el Envelope con su ``seq``"""
+        self.seq += 1
+        stamped = stamp(envelope, self.seq)
+        self.entries.append(stamped)
+        return stamped
+
+    def since(self, last_seq, epoch=None):
+        """Mensajes posteriores a ``last_seq``, o None si el hueco ya no está en el historial"""
+        if epoch != self.epoch or last_seq > self.seq:
+            # El cliente viene de otro worker o nodo, o de antes de un reinicio sin historial
+            return None
+        oldest = self.entries[0].data["seq"] if self.entries else self.seq + 1
+        if last_seq < oldest - 1:
+            return None
+        return [envelope for envelope in self.entries if envelope.data["seq"] > last_seq]
+
+    def restore(self, envelopes, epoch):
+        """Cargar mensajes ya numerados (en orden) de la numeración ``epoch`` al arrancar"""
+        self.epoch = epoch
+        for envelope in envelopes:
+            self.entries.append(envelope)
+            self.seq = max(self.seq, envelope.data["seq"])
+
+
+class HistoryMirror:
+    """Copia del historial en Redis Streams, escrita en segundo plano"""
+
+    def __init__(self, redis_client, node_id=None, maxlen=HISTORY_SIZE):
+        self.redis = redis_client
+        self.node_id = node_id
+        self.maxlen = maxlen
+        self._outbox = collections.deque()
+        self._waiter = None
+
+    def append(self, history, envelope):
+        self._outbox.append((history.channel, history.epoch, envelope))
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def load(self, history):
+        """Rellenar un historial con las últimas entradas del stream"""
+        entries = await self.redis.xrevrange(stream_key(history.channel, self.node_id), count=self.maxlen)
+        if not entries or b"epoch" not in entries[0][1]:
+            return 0
+        # Solo la numeración más reciente; las anteriores ya no sirven para reanudar
+        epoch = entries[0][1][b"epoch"]
+        restored = []
+        for _, fields in entries:
+            if fields.get(b"epoch") != epoch:
+                break
+            restored.append(Envelope(json.loads(fields[b"payload"]), payload=fields[b"payload"]))
+        history.restore(reversed(restored), epoch.decode())
+        return len(restored)
+
+    async def run_writer(self):
+        """Escribir las entradas pendientes en lotes con pipeline"""
+        while True:
+            if not self._outbox:
+                self._waiter = asyncio.get_running_loop().create_future()
+                await self._waiter
+                self._waiter = None
+
+            batch = [self._outbox.popleft() for _ in range(min(len(self._outbox), HISTORY_WRITE_BATCH))]
+            pipe = self.redis.pipeline(transaction=False)
+            for channel, epoch, envelope in batch:
+                pipe.xadd(
+                    stream_key(channel, self.node_id),
+                    {"seq": envelope.data["seq"], "epoch": epoch, "payload": envelope.payload},
+                    maxlen=self.maxlen, approximate=True,
+                )
+            try:
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"No se pudieron guardar {len(batch)} mensajes del historial: {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,86 @@
+# push_api.py
+# Entrada HTTP para que otros servicios envíen mensajes a los clientes WebSocket
+#
+# Implementa los endpoints que usa notification-service:
+#   POST /api/v1/send/user/{user_id}  {"event": ..., "data": {...}}
+#   POST /api/v1/broadcast            {"roles": [...], "event": ..., "data": {...}}
+import datetime
+import json
+import logging
+
+from aiohttp import web
+
+logger = logging.getLogger("websocket_server.push_api")
+
+
+def push_message(body):
+    """Mensaje que reciben los clientes por el WebSocket"""
+    return {
+        "type": body.get("event", "notification"),
+        "data": body.get("data"),
+        "timestamp": datetime.datetime.now().isoformat(),
+    }
+
+
+async def read_json(request):
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise web.HTTPBadRequest(text="Cuerpo JSON inválido")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Se esperaba un objeto JSON")
+    return body
+
+
+def valid_name(value):
+    """Identificador de usuario o rol: texto no vacío (los roles viajan unidos por comas)"""
+    return isinstance(value, str) and bool(value.strip()) and "," not in value
+
+
+def create_push_app(send_to_user, send_to_roles):
+    """Crear la aplicación HTTP de push
+
+    ``send_to_user(user_id, message)`` y ``send_to_roles(roles, message)``
+    entregan el mensaje y devuelven cuántas conexiones locales lo recibieron.
+    """
+    routes = web.RouteTableDef()
+
+    @routes.post("/api/v1/send/user/{user_id}")
+    async def send_user(request):
+        body = await read_json(request)
+        user_id = request.match_info["user_id"]
+        if not valid_name(user_id):
+            raise web.HTTPBadRequest(text="user_id inválido")
+        delivered = send_to_user(user_id, push_message(body))
+        logger.info(f"Push a usuario {user_id}: {delivered} conexiones locales")
+        return web.json_response({"status": "sent", "user_id": user_id, "delivered": delivered})
+
+    @routes.post("/api/v1/broadcast")
+    async def broadcast_roles(request):
+        body = await read_json(request)
+        roles = body.get("roles") or ["all"]
+        if not isinstance(roles, list):
+            raise web.HTTPBadRequest(text="roles debe ser una lista")
+        if not all(valid_name(role) for role in roles):
+            raise web.HTTPBadRequest(text="Cada rol debe ser un texto no vacío")
+        delivered = send_to_roles(roles, push_message(body))
+        logger.info(f"Push a roles {roles}: {delivered} conexiones locales")
+        return web.json_response({"status": "sent", "roles": roles, "delivered": delivered})
+
+    @routes.get("/health")
+    async def health(request):
+        return web.json_response({"status": "healthy"})
+
+    app = web.Application()
+    app.add_routes(routes)
+    return app
+
+
+async def start_push_server(app, host, port, reuse_port=False):
+    """Arrancar el servidor HTTP en el event loop actual"""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port, reuse_port=reuse_port)
+    await site.start()
+    logger.info(f"API HTTP de push iniciada en http://{host}:{port}")
+    return runner
@@ -0,0 +1,88 @@
+# reaper.py
+# Detección y expulsión periódica de conexiones muertas, bloqueadas u ociosas
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("websocket_server.reaper")
+
+# Ping/pong de websockets: intervalo entre pings y espera máxima del pong (0 desactiva)
+PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", 20)) or None
+PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", 20)) or None
+# Segundos sin recibir nada del cliente antes de cerrarlo (0 desactiva).
+# Los clientes que solo escuchan deben enviar {"type": "ping"} periódicamente
+IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 0))
+# Cada cuánto se revisan las conexiones
+REAP_INTERVAL = float(os.getenv("WS_REAP_INTERVAL", os.getenv("WS_SEND_WATCHDOG_INTERVAL", 1.0)))
+
+# Código y motivo de cierre según la causa
+CLOSE_REASONS = {
+    "socket_closed": (1006, "socket closed"),
+    "send_timeout": (1011, "send timeout"),
+    "idle": (1001, "idle timeout"),
+}
+
+
+class ConnectionReaper:
+    """Revisa todas las conexiones en una sola tarea y expulsa las muertas en bloque
+
+    Una conexión se expulsa si su socket ya está cerrado, si lleva un envío
+    bloqueado más de SEND_TIMEOUT o si no ha enviado nada en IDLE_TIMEOUT.
+    Al expulsarla se saca del registro en el momento, así las difusiones
+    dejan de encolarle mensajes aunque su manejador todavía no haya terminado.
+    """
+
+    def __init__(self, registry, interval=REAP_INTERVAL, idle_timeout=IDLE_TIMEOUT):
+        self.registry = registry
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.reaped = {reason: 0 for reason in (*CLOSE_REASONS, "ping_timeout")}
+        # Mensajes que estaban encolados para conexiones muertas y no se enviaron
+        self.discarded_messages = 0
+        # Segundos entre la última señal de vida y la expulsión, sumados
+        self.dead_seconds = 0.0
+
+    def reason(self, connection, now):
+        """Motivo para expulsar una conexión, o None si está sana"""
+        if connection.websocket.closed:
+            return "socket_closed"
+        if connection.send_stalled(now):
+            return "send_timeout"
+        if self.idle_timeout and now - connection.last_seen > self.idle_timeout:
+            return "idle"
+        return None
+
+    def reap(self, now=None):
+        """Expulsar las conexiones muertas; devuelve cuántas se expulsaron"""
+        now = now if now is not None else time.monotonic()
+        dead = [(c, reason) for c in self.registry.all() if (reason := self.reason(c, now))]
+        for connection, reason in dead:
+            self.record(connection, reason, now)
+            code, close_reason = CLOSE_REASONS[reason]
+            connection.close(code=code, reason=close_reason)
+            self.registry.remove(connection)
+        if dead:
+            logger.warning(f"Expulsadas {len(dead)} conexiones: "
+                           + ", ".join(f"{c.client_id} ({reason})" for c, reason in dead))
+        return len(dead)
+
+    def record(self, connection, reason, now=None):
+        """Contabilizar una conexión muerta (también las que cierra el ping de websockets)"""
+        now = now if now is not None else time.monotonic()
+        self.reaped[reason] += 1
+        self.discarded_messages += len(connection.queue)
+        self.dead_seconds += max(0.0, now - connection.last_seen)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.reap()
+
+    def stats(self):
+        total = sum(self.reaped.values())
+        return {
+            "reaped": self.reaped,
+            "discarded_messages": self.discarded_messages,
+            "avg_seconds_since_last_seen": round(self.dead_seconds / total, 3) if total else None,
+        }
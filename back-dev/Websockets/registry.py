@@ -0,0 +1,79 @@
+# registry.py
+# Registro de conexiones con índices secundarios por canal, usuario y rol
+import itertools
+
+
+class ConnectionRegistry:
+    """Conexiones activas indexadas por client_id, canal, usuario y rol
+
+    Conectar, desconectar y cambiar de canal son O(1); buscar las conexiones
+    de un usuario, un rol o un canal no recorre el resto de clientes.
+
+    ``by_client`` apunta a la última conexión de cada client_id. Si un cliente
+    reconecta con el mismo id antes de que se cierre la conexión anterior,
+    las dos siguen en ``connections`` y en los demás índices hasta que se
+    quita cada una.
+    """
+
+    def __init__(self, channels):
+        self.connections = set()
+        self.by_client = {}
+        self.by_channel = {channel: set() for channel in channels}
+        self.by_user = {}
+        self.by_role = {}
+
+    def __len__(self):
+        return len(self.connections)
+
+    def add(self, connection):
+        self.connections.add(connection)
+        self.by_client[connection.client_id] = connection
+        self.by_user.setdefault(connection.user_id, set()).add(connection)
+        self.by_role.setdefault(connection.role, set()).add(connection)
+        if connection.channel in self.by_channel:
+            self.by_channel[connection.channel].add(connection)
+
+    def remove(self, connection):
+        self.connections.discard(connection)
+        # Un client_id reconectado ya apunta a la conexión nueva: no tocarla
+        if self.by_client.get(connection.client_id) is connection:
+            del self.by_client[connection.client_id]
+        _discard(self.by_user, connection.user_id, connection)
+        _discard(self.by_role, connection.role, connection)
+        self.by_channel.get(connection.channel, set()).discard(connection)
+
+    def move(self, connection, channel):
+        """Cambiar una conexión de canal"""
+        self.by_channel.get(connection.channel, set()).discard(connection)
+        connection.channel = channel
+        if channel in self.by_channel:
+            self.by_channel[channel].add(connection)
+
+    def channels(self):
+        return list(self.by_channel)
+
+    def is_channel(self, channel):
+        return channel in self.by_channel
+
+    def channel(self, channel):
+        return self.by_channel.get(channel, ())
+
+    def user(self, user_id):
+        return self.by_user.get(user_id, ())
+
+    def roles(self, roles):
+        """Conexiones con alguno de los roles ("all" incluye a todos)"""
+        if "all" in roles:
+            return self.connections
+        return itertools.chain.from_iterable(self.by_role.get(role, ()) for role in set(roles))
+
+    def all(self):
+        return self.connections
+
+
+def _discard(index, key, connection):
+    connections = index.get(key)
+    if connections is not None:
+        connections.discard(connection)
+        if not connections:
+            del index[key]
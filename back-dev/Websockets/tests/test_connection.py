@@ -0,0 +1,125 @@
+"""
+Pruebas de la cola de salida por cliente y de sus políticas de desborde
+"""
+import asyncio
+import json
+
+from connection import ClientConnection
+
+
+class SlowSocket:
+    """Socket que no envía nada hasta que se abre ``gate``"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.sent = []
+        self.closed = False
+        self.close_code = None
+
+    async def send(self, text):
+        await self.gate.wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = True
+        self.close_code = code
+
+
+def chat(n):
+    return {"type": "message", "n": n}
+
+
+def presence(client_id, action="user_joined", channel="general"):
+    return {"type": "system", "action": action, "client_id": client_id, "channel": channel}
+
+
+def emergency(n):
+    return {"type": "emergency", "n": n}
+
+
+def queued(connection):
+    return [envelope.data for envelope in connection.queue]
+
+
+def run(policy, messages, max_queue=3):
+    """Encolar ``messages`` sin ceder el loop (la tarea escritora aún no ha empezado)"""
+    async def scenario():
+        connection = ClientConnection(SlowSocket(), "c1", "Ana", "officer", "general",
+                                      max_queue=max_queue, policy=policy)
+        accepted = [connection.send(message) for message in messages]
+        result = queued(connection), accepted, connection.dropped
+        connection.close()
+        await asyncio.sleep(0)
+        return result
+
+    return asyncio.run(scenario())
+
+
+def test_drop_oldest_keeps_the_newest_messages():
+    queue, accepted, dropped = run("drop_oldest", [chat(n) for n in range(5)])
+    assert queue == [chat(2), chat(3), chat(4)]
+    assert accepted == [True] * 5
+    assert dropped == 2
+
+
+def test_urgent_messages_survive_drop_oldest():
+    queue, _, dropped = run("drop_oldest", [emergency(1), chat(1), chat(2), chat(3)])
+    assert queue == [emergency(1), chat(2), chat(3)]
+    assert dropped == 1
+
+
+def test_queue_full_of_urgent_messages_drops_new_normal_message():
+    queue, accepted, _ = run("drop_oldest", [emergency(n) for n in range(3)] + [chat(1)])
+    assert queue == [emergency(0), emergency(1), emergency(2)]
+    assert accepted[-1] is False
+
+
+def test_queue_full_of_urgent_messages_makes_room_for_a_new_urgent_one():
+    queue, accepted, _ = run("drop_oldest", [emergency(n) for n in range(4)])
+    assert queue == [emergency(1), emergency(2), emergency(3)]
+    assert accepted == [True] * 4
+
+
+def test_coalesce_replaces_presence_of_the_same_client_and_channel():
+    messages = [presence("a"), chat(1), presence("b"), presence("a", "user_left")]
+    queue, _, dropped = run("coalesce", messages)
+    assert queue == [chat(1), presence("b"), presence("a", "user_left")]
+    assert dropped == 1
+
+
+def test_coalesce_falls_back_to_dropping_the_oldest():
+    messages = [presence("a"), chat(1), chat(2), presence("a", channel="otro")]
+    queue, _, _ = run("coalesce", messages)
+    assert queue == [chat(1), chat(2), presence("a", channel="otro")]
+
+
+def test_disconnect_closes_the_slow_client():
+    async def scenario():
+        socket = SlowSocket()
+        connection = ClientConnection(socket, "c1", "Ana", "officer", "general", max_queue=2,
+                                      policy="disconnect")
+        accepted = [connection.send(chat(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        return accepted, connection.closed, connection.send(chat(9)), socket
+
+    accepted, closed, after_close, socket = asyncio.run(scenario())
+    assert accepted == [True, True, False]
+    assert closed
+    assert after_close is False
+    assert socket.close_code == 1013
+
+
+def test_queued_messages_are_delivered_in_order():
+    async def scenario():
+        socket = SlowSocket()
+        connection = ClientConnection(socket, "c1", "Ana", "officer", "general", max_queue=10)
+        for n in range(4):
+            connection.send(chat(n))
+        socket.gate.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        connection.close()
+        return socket.sent
+
+    sent = asyncio.run(scenario())
+    assert [json.loads(message) for message in sent] == [chat(n) for n in range(4)]
@@ -0,0 +1,91 @@
+"""
+Pruebas del historial por canal y de la reanudación por seq/epoch
+"""
+import json
+
+import pytest
+
+from envelope import Envelope
+from history import ChannelHistory
+
+
+def filled(size, count):
+    history = ChannelHistory("general", size)
+    for n in range(count):
+        history.record(Envelope({"n": n}))
+    return history
+
+
+def seqs(envelopes):
+    return [envelope.data["seq"] for envelope in envelopes]
+
+
+def test_since_returns_messages_after_last_seq():
+    history = filled(10, 5)
+    assert seqs(history.since(2, history.epoch)) == [3, 4, 5]
+
+
+def test_since_up_to_date_is_empty():
+    history = filled(10, 5)
+    assert history.since(5, history.epoch) == []
+
+
+def test_since_from_zero_while_nothing_was_evicted():
+    history = filled(10, 5)
+    assert seqs(history.since(0, history.epoch)) == [1, 2, 3, 4, 5]
+
+
+def test_since_oldest_boundary():
+    history = filled(3, 6)  # quedan 4, 5 y 6
+    assert seqs(history.since(3, history.epoch)) == [4, 5, 6]
+    assert history.since(2, history.epoch) is None
+
+
+def test_since_ahead_of_history_is_a_gap():
+    history = filled(10, 5)
+    assert history.since(6, history.epoch) is None
+
+
+def test_since_with_other_or_missing_epoch_is_a_gap():
+    history = filled(10, 5)
+    other = filled(10, 5)
+    assert history.epoch != other.epoch
+    assert history.since(2, other.epoch) is None
+    assert history.since(2, None) is None
+
+
+def test_empty_history():
+    history = ChannelHistory("general", 10)
+    assert history.since(0, history.epoch) == []
+    assert history.since(1, history.epoch) is None
+
+
+def test_restore_continues_numbering_in_the_stored_epoch():
+    source = filled(10, 3)
+    history = ChannelHistory("general", 10)
+    history.restore(list(source.entries), source.epoch)
+    assert history.epoch == source.epoch
+    assert seqs(history.since(1, source.epoch)) == [2, 3]
+    assert history.record(Envelope({"n": 3})).data["seq"] == 4
+
+
+def test_record_splices_seq_into_the_cached_payload():
+    history = ChannelHistory("general", 10)
+    original = Envelope({"text": "ñ"}, payload=b'{"text": "\xc3\xb1"}\n')
+    stamped = history.record(original)
+    assert stamped.payload == b'{"text": "\xc3\xb1","seq":1}'
+    assert json.loads(stamped.payload) == {"text": "ñ", "seq": 1}
+    assert original.data == {"text": "ñ"}
+
+
+def test_record_empty_object_and_existing_seq():
+    history = ChannelHistory("general", 10)
+    assert json.loads(history.record(Envelope({})).payload) == {"seq": 1}
+    assert json.loads(history.record(Envelope({"seq": 99, "n": 1})).payload) == {"seq": 2, "n": 1}
+
+
+@pytest.mark.parametrize("payload", [b"{ }", b"{\n}", b"{\t \r\n}\n", b'{"n": 1 }', b'{\n  "n": 1\n}'])
+def test_record_splices_into_payloads_with_whitespace(payload):
+    history = ChannelHistory("general", 10)
+    stamped = history.record(Envelope(json.loads(payload), payload=payload))
+    assert json.loads(stamped.payload) == {**json.loads(payload), "seq": 1}
@@ -0,0 +1,89 @@
+"""
+Pruebas de validación de la API HTTP de push
+"""
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from push_api import create_push_app
+
+
+def post(path, payload=None, data=None):
+    """Hacer un POST a la API y devolver (status, respuesta, envíos realizados)"""
+    sent = []
+
+    def send_to_user(user_id, message):
+        sent.append(("user", user_id, message))
+        return 1
+
+    def send_to_roles(roles, message):
+        sent.append(("roles", roles, message))
+        return 1
+
+    async def run():
+        app = create_push_app(send_to_user, send_to_roles)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(path, json=payload, data=data)
+            return response.status, await response.text()
+
+    status, text = asyncio.run(run())
+    return status, text, sent
+
+
+def test_broadcast_delivers_to_roles():
+    status, _, sent = post("/api/v1/broadcast", {"roles": ["admin"], "event": "alerta"})
+    assert status == 200
+    assert sent[0][:2] == ("roles", ["admin"])
+    assert sent[0][2]["type"] == "alerta"
+
+
+def test_broadcast_without_roles_goes_to_all():
+    status, _, sent = post("/api/v1/broadcast", {"event": "alerta"})
+    assert status == 200
+    assert sent[0][1] == ["all"]
+
+
+def test_broadcast_rejects_non_list_roles():
+    status, _, sent = post("/api/v1/broadcast", {"roles": "admin"})
+    assert status == 400
+    assert sent == []
+
+
+def test_broadcast_rejects_non_string_roles():
+    for roles in ([{}], [1], [None], ["admin", 2]):
+        status, _, sent = post("/api/v1/broadcast", {"roles": roles})
+        assert status == 400, roles
+        assert sent == []
+
+
+def test_broadcast_rejects_empty_or_comma_roles():
+    for roles in ([""], ["  "], ["admin,officer"]):
+        status, _, sent = post("/api/v1/broadcast", {"roles": roles})
+        assert status == 400, roles
+        assert sent == []
+
+
+def test_body_must_be_object():
+    for payload in ([1], "texto", 3):
+        status, _, sent = post("/api/v1/broadcast", payload)
+        assert status == 400
+        assert sent == []
+
+
+def test_invalid_json_is_rejected():
+    status, _, sent = post("/api/v1/send/user/7", data=b"{no es json")
+    assert status == 400
+    assert sent == []
+
+
+def test_send_user_delivers():
+    status, _, sent = post("/api/v1/send/user/7", {"event": "aviso", "data": {"x": 1}})
+    assert status == 200
+    assert sent[0][:2] == ("user", "7")
+    assert sent[0][2]["data"] == {"x": 1}
+
+
+def test_send_user_rejects_blank_user_id():
+    status, _, sent = post("/api/v1/send/user/%20", {"event": "aviso"})
+    assert status == 400
+    assert sent == []
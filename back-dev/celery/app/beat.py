@@ -1,11 +1,33 @@
 """
 Simulación de Celery beat para tareas programadas
+
+Cada entrada de ``SCHEDULED_TASKS`` tiene una expresión cron. El scheduler
+guarda en un montículo la próxima ejecución de cada una, duerme hasta la más
+cercana y la encola en el broker al llegar su hora.
+
+Pueden correr varias réplicas: solo encola la que tiene el lease de líder
+(ver ``leader.py``). La hora programada de la última ejecución de cada tarea
+se guarda en Redis junto con el encolado, en un script que comprueba el lease,
+así al cambiar de líder o reiniciar se sabe qué ejecuciones se perdieron. Qué
+hacer con ellas lo decide el campo ``misfire`` de cada tarea:
+
+- ``coalesce``: encolar una sola vez, por todas las perdidas
+- ``catch_up``: encolar cada una (como mucho ``MAX_CATCH_UP``)
+- ``skip``: descartarlas, salvo la última si no pasó ``MISFIRE_GRACE``
 """
 import os
 import time
-import random
+import heapq
+import collections
+import signal
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+
+import redis
+
+from broker import QUEUE_MAXLEN, encode_task, queue_for, queue_key
+from cron import CronError, CronExpression
+from leader import LeaderLease
 
 # Configurar logging
 logging.basicConfig(
@@ -14,6 +36,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger("celery_beat")
 
+# Espera máxima entre consultas del reloj, por si se ajusta la hora del sistema
+MAX_SLEEP = float(os.getenv("CELERY_BEAT_MAX_SLEEP", 300))
+# Hash con la última ejecución programada ya atendida (ISO) de cada tarea, por nombre
+LAST_RUN_KEY = "celery:beat:last_run"
+MISFIRE_POLICIES = ("coalesce", "catch_up", "skip")
+DEFAULT_MISFIRE = os.getenv("CELERY_BEAT_DEFAULT_MISFIRE", "coalesce")
+# Segundos de retraso con los que una ejecución aún se considera puntual
+MISFIRE_GRACE = float(os.getenv("CELERY_BEAT_MISFIRE_GRACE", 60))
+# Ejecuciones perdidas que se recuperan como máximo con catch_up
+MAX_CATCH_UP = int(os.getenv("CELERY_BEAT_MAX_CATCH_UP", 10))
+
+# Registrar la última ejecución y encolar la tarea, solo si el lease es nuestro
+ENQUEUE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+if #ARGV > 4 then
+    redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[4], '*', unpack(ARGV, 5))
+end
+return 1
+"""
+
 # Lista de tareas programadas
 SCHEDULED_TASKS = [
     {
@@ -21,73 +66,222 @@ SCHEDULED_TASKS = [
         "task": "generate_report",
         "schedule": "0 7 * * *",  # 7:00 AM diariamente
         "args": ["actividad_diaria", "últimas 24 horas"],
-        "description": "Generar reporte diario de actividad"
+        "description": "Generar reporte diario de actividad",
+        "misfire": "coalesce"
     },
     {
         "name": "weekly_crime_stats",
         "task": "generate_report",
         "schedule": "0 9 * * 1",  # 9:00 AM los lunes
         "args": ["estadisticas_crimenes", "última semana"],
-        "description": "Estadísticas semanales de crímenes"
+        "description": "Estadísticas semanales de crímenes",
+        "misfire": "coalesce"
     },
     {
         "name": "officer_performance_monthly",
         "task": "generate_report",
         "schedule": "0 8 1 * *",  # 8:00 AM el primer día del mes
         "args": ["rendimiento_oficiales", "último mes"],
-        "description": "Reporte mensual de rendimiento de oficiales"
+        "description": "Reporte mensual de rendimiento de oficiales",
+        "misfire": "coalesce"
     },
     {
         "name": "external_data_sync",
         "task": "sync_external_data",
         "schedule": "0 */4 * * *",  # Cada 4 horas
         "args": ["sistema_nacional"],
-        "description": "Sincronización con sistema nacional"
+        "description": "Sincronización con sistema nacional",
+        "misfire": "coalesce"
     },
     {
         "name": "database_cleanup",
         "task": "clean_old_data",
         "schedule": "0 2 * * 0",  # 2:00 AM los domingos
         "args": [90],  # 90 días
-        "description": "Limpieza de datos antiguos"
+        "description": "Limpieza de datos antiguos",
+        "misfire": "coalesce"
     },
     {
         "name": "reminder_notifications",
         "task": "send_reminders",
         "schedule": "0 8 * * 1-5",  # 8:00 AM de lunes a viernes
         "args": [],
-        "description": "Envío de recordatorios diarios"
+        "description": "Envío de recordatorios diarios",
+        "misfire": "skip"
     }
 ]
 
-# Simular ejecución de beat
+# Conexión a Redis (broker)
+def connect_to_broker():
+    redis_host = os.getenv("REDIS_HOST", "localhost")
+    redis_port = int(os.getenv("REDIS_PORT", 6379))
+    logger.info(f"Conectando a Redis broker en {redis_host}:{redis_port}")
+    client = redis.Redis(host=redis_host, port=redis_port, db=int(os.getenv("REDIS_DB", 0)))
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        logger.error(f"No se pudo conectar al broker: {e}")
+        return None
+    return client
+
+def missed_runs(cron, last_run, now):
+    """Ejecuciones programadas en (last_run, now]: las MAX_CATCH_UP últimas y el total"""
+    runs = collections.deque(maxlen=MAX_CATCH_UP)
+    total = 0
+    run = cron.next_after(last_run)
+    while run <= now:
+        runs.append(run)
+        total += 1
+        run = cron.next_after(run)
+    return list(runs), total
+
+def plan_runs(policy, runs, now):
+    """Ejecuciones que se encolan de las pendientes según la política"""
+    if policy == "catch_up":
+        return runs
+    if policy == "skip":
+        return [run for run in runs[-1:] if (now - run).total_seconds() <= MISFIRE_GRACE]
+    return runs[-1:]
+
+class BeatScheduler:
+    """Próximas ejecuciones de las tareas programadas, encoladas con fencing"""
+
+    def __init__(self, client, tasks, lease):
+        self.lease = lease
+        self.tasks = []
+        self.crons = []
+        for task in tasks:
+            try:
+                cron = CronExpression(task["schedule"])
+            except CronError as e:
+                logger.error(f"Tarea {task['name']} descartada, expresión inválida: {e}")
+                continue
+            policy = task.get("misfire", DEFAULT_MISFIRE)
+            if policy not in MISFIRE_POLICIES:
+                logger.error(f"Tarea {task['name']} descartada, misfire desconocido: {policy}")
+                continue
+            self.tasks.append(task)
+            self.crons.append(cron)
+        self.last_run = [None] * len(self.tasks)
+        self.heap = []
+        self.client = client
+        self._enqueue = client.register_script(ENQUEUE_SCRIPT)
+
+    def load(self, now):
+        """Leer las últimas ejecuciones de Redis y calcular las próximas (al tomar el liderazgo)"""
+        stored = {
+            name.decode(): datetime.fromisoformat(value.decode())
+            for name, value in self.client.hgetall(LAST_RUN_KEY).items()
+        }
+        self.heap = []
+        for index, (task, cron) in enumerate(zip(self.tasks, self.crons)):
+            last_run = stored.get(task["name"])
+            if last_run is None:
+                # Sin historial: se empieza a contar desde ahora
+                last_run = now
+                self.record(index, now)
+            self.last_run[index] = last_run
+            self.heap.append((cron.next_after(last_run), index))
+            logger.info(f"Tarea programada: {task['name']} - {task['schedule']} - {task['description']} "
+                        f"(próxima: {self.heap[-1][0]:%Y-%m-%d %H:%M})")
+        heapq.heapify(self.heap)
+
+    def seconds_until_next(self, now):
+        return (self.heap[0][0] - now).total_seconds()
+
+    def record(self, index, run_at, send=False):
+        """Guardar la última ejecución (y encolar la tarea si ``send``); False si ya no somos líder"""
+        task = self.tasks[index]
+        args = [self.lease.value, task["name"], run_at.isoformat()]
+        keys = [self.lease.key, LAST_RUN_KEY]
+        if send:
+            fields = encode_task(task["task"], task["args"])
+            keys.append(queue_key(queue_for(task["task"])))
+            args.append(QUEUE_MAXLEN)
+            args += [item for field in fields.items() for item in field]
+        if not self._enqueue(keys=keys, args=args):
+            return False
+        if send:
+            logger.info(f"Tarea {task['task']} ({fields['id']}) enviada a la cola con args: {task['args']} "
+                        f"(programada {run_at:%Y-%m-%d %H:%M})")
+        return True
+
+    def run_due(self, now):
+        """Encolar la tarea más próxima según su política; False si ya no somos líder"""
+        _, index = self.heap[0]
+        task = self.tasks[index]
+        runs, total = missed_runs(self.crons[index], self.last_run[index], now)
+        planned = plan_runs(task.get("misfire", DEFAULT_MISFIRE), runs, now)
+        logger.info(f"Programando tarea: {task['name']} - {task['description']}")
+        if total > len(planned):
+            logger.warning(f"{task['name']}: {total} ejecuciones pendientes, se encolan {len(planned)} "
+                           f"(misfire {task.get('misfire', DEFAULT_MISFIRE)})")
+        for run_at in planned:
+            if not self.record(index, run_at, send=True):
+                return False
+            self.last_run[index] = run_at
+        if self.last_run[index] != runs[-1]:
+            if not self.record(index, runs[-1]):
+                return False
+            self.last_run[index] = runs[-1]
+        heapq.heapreplace(self.heap, (self.crons[index].next_after(runs[-1]), index))
+        return True
+
+# Beat: encola cada tarea a su hora mientras sea líder
 def run_beat():
     logger.info("Iniciando Celery beat scheduler")
-    
-    # Simular carga de configuración
+
+    client = connect_to_broker()
+    if client is None:
+        logger.error("Error conectando a servicios requeridos")
+        return False
+
     logger.info(f"Cargando {len(SCHEDULED_TASKS)} tareas programadas")
-    for task in SCHEDULED_TASKS:
-        logger.info(f"Tarea programada: {task['name']} - {task['schedule']} - {task['description']}")
-    
-    logger.info("Beat scheduler iniciado")
-    
-    # Simulación de ejecución continua
-    while True:
-        current_time = datetime.now()
-        
-        # Simular verificación de tareas a ejecutar
-        for task in SCHEDULED_TASKS:
-            # Simulamos aleatoriamente si una tarea debe ejecutarse
-            if random.random() < 0.1:  # 10% de probabilidad de ejecutar cada tarea en cada ciclo
-                logger.info(f"Programando tarea: {task['name']} - {task['description']}")
-                
-                # Simular envío a la cola
-                logger.info(f"Enviando tarea {task['task']} a la cola con args: {task['args']}")
-        
-        # Esperar antes de la siguiente verificación
-        time.sleep(60)  # Verificar cada minuto
+    lease = LeaderLease(client)
+    scheduler = BeatScheduler(client, SCHEDULED_TASKS, lease)
+    if not scheduler.tasks:
+        logger.error("No hay tareas programadas válidas")
+        return False
+
+    logger.info(f"Beat scheduler {lease.holder} iniciado, esperando el liderazgo")
+    next_renew = 0.0
+    try:
+        while True:
+            try:
+                if not lease.is_leader:
+                    if not lease.acquire():
+                        time.sleep(lease.renew_interval)
+                        continue
+                    scheduler.load(datetime.now())
+                    next_renew = time.monotonic() + lease.renew_interval
+                elif time.monotonic() >= next_renew:
+                    if not lease.renew():
+                        continue
+                    next_renew = time.monotonic() + lease.renew_interval
+
+                wait = scheduler.seconds_until_next(datetime.now())
+                if wait > 0:
+                    # Dormir hasta la próxima tarea o la próxima renovación del lease
+                    time.sleep(max(0, min(wait, MAX_SLEEP, next_renew - time.monotonic())))
+                    continue
+                if not scheduler.run_due(datetime.now()):
+                    lease.lose()
+            except redis.RedisError as e:
+                # Lo ya registrado no se repite; el resto se reintenta o lo hará otra réplica
+                logger.error(f"Error de Redis en beat: {e}")
+                time.sleep(lease.renew_interval)
+    finally:
+        try:
+            lease.release()
+        except redis.RedisError:
+            pass
+
+def handle_sigterm(signum, frame):
+    # Kubernetes envía SIGTERM al parar el pod: salir como con Ctrl+C
+    raise KeyboardInterrupt
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, handle_sigterm)
     try:
         run_beat()
     except KeyboardInterrupt:
@@ -0,0 +1,205 @@
+"""
+Cola de tareas sobre Redis Streams para la simulación de Celery
+
+Cada tarea es una entrada de un stream con el nombre de la tarea y sus
+argumentos en JSON. Hay un stream por cola (``celery:queue:notifications``,
+``celery:queue:reports``...) y cada tipo de tarea va a la suya según
+``TASK_QUEUES``, así las notificaciones nunca esperan detrás de un lote de
+reportes o sincronizaciones.
+
+Los workers leen con XREADGROUP dentro de un consumer group, de modo que cada
+tarea la recibe un solo worker, y la confirman con XACK al terminarla. Si un
+worker muere con tareas sin confirmar, otro las recupera con XAUTOCLAIM pasado
+``CLAIM_IDLE_MS``.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger("celery_broker")
+
+QUEUE_PREFIX = "celery:queue:"
+RESULT_PREFIX = "celery:result:"
+DEFAULT_QUEUE = "default"
+# Cola de cada tipo de tarea; las que no aparecen van a DEFAULT_QUEUE
+TASK_QUEUES = {
+    "send_notification": "notifications",
+    "send_reminders": "notifications",
+    "generate_report": "reports",
+    "sync_external_data": "sync",
+    "clean_old_data": "maintenance",
+}
+CONSUMER_GROUP = os.getenv("CELERY_CONSUMER_GROUP", "workers")
+# Entradas que se conservan por cola (aproximado, XADD MAXLEN ~)
+QUEUE_MAXLEN = int(os.getenv("CELERY_QUEUE_MAXLEN", 100000))
+# Tiempo sin confirmar tras el cual una tarea se reasigna a otro worker
+CLAIM_IDLE_MS = int(os.getenv("CELERY_CLAIM_IDLE_MS", 300000))
+# Segundos que se guarda el resultado de una tarea
+RESULT_TTL = int(os.getenv("CELERY_RESULT_TTL", 86400))
+
+
+def queue_key(queue):
+    return f"{QUEUE_PREFIX}{queue}"
+
+
+def result_key(task_id):
+    return f"{RESULT_PREFIX}{task_id}"
+
+
+def queue_for(task):
+    return TASK_QUEUES.get(task, DEFAULT_QUEUE)
+
+
+def tasks_for(queue):
+    """Tipos de tarea que se encolan en ``queue`` según TASK_QUEUES"""
+    return [task for task, target in TASK_QUEUES.items() if target == queue]
+
+
+def parse_queues(text):
+    """Convertir "notifications=6,reports=1,sync" en {cola: peso}, en orden (peso 1 por defecto)"""
+    queues = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        queues[name.strip()] = float(weight) if weight else 1.0
+    return queues
+
+
+def default_consumer_name():
+    return os.getenv("CELERY_WORKER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def encode_task(task, args=(), kwargs=None, task_id=None):
+    """Campos del stream para una tarea"""
+    return {
+        "id": task_id or uuid.uuid4().hex,
+        "task": task,
+        "args": json.dumps(list(args)),
+        "kwargs": json.dumps(kwargs or {}),
+        "enqueued_at": datetime.now().isoformat(),
+    }
+
+
+def decode_task(fields):
+    """Reconstruir una tarea a partir de los campos leídos del stream"""
+    fields = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in fields.items()
+    }
+    return {
+        "id": fields["id"],
+        "task": fields["task"],
+        "args": json.loads(fields.get("args", "[]")),
+        "kwargs": json.loads(fields.get("kwargs", "{}")),
+        "enqueued_at": fields.get("enqueued_at"),
+    }
+
+
+class TaskProducer:
+    """Encola tareas para los workers"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def send(self, task, args=(), kwargs=None, queue=None):
+        """Encolar una tarea en su cola (o en ``queue``); devuelve su id"""
+        fields = encode_task(task, args, kwargs)
+        self.client.xadd(queue_key(queue or queue_for(task)), fields, maxlen=QUEUE_MAXLEN, approximate=True)
+        return fields["id"]
+
+
+class TaskConsumer:
+    """Lee tareas de una o varias colas como miembro del consumer group
+
+    ``order()`` da el orden en que el worker recorre las colas. Con prioridad
+    ``strict`` es el orden dado: una cola solo recibe los huecos que dejan las
+    anteriores. Con ``weighted`` el orden se sortea en cada vuelta según el
+    peso de cada cola, así con todas llenas cada una recibe una parte
+    proporcional del worker.
+
+    Cada tarea leída se identifica con ``(cola, message_id)`` para confirmarla.
+    """
+
+    def __init__(self, client, queues=None, priority="strict", group=CONSUMER_GROUP, consumer=None):
+        self.client = client
+        self.queues = dict(queues or {DEFAULT_QUEUE: 1.0})
+        if priority not in ("strict", "weighted"):
+            raise ValueError(f"Prioridad desconocida: {priority}")
+        self.priority = priority
+        self.group = group
+        self.consumer = consumer or default_consumer_name()
+
+    def ensure_group(self):
+        """Crear los streams y el consumer group si no existen"""
+        for queue in self.queues:
+            try:
+                self.client.xgroup_create(queue_key(queue), self.group, id="0", mkstream=True)
+            except Exception as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    def order(self):
+        """Orden en que se consultan las colas en esta lectura"""
+        if self.priority == "strict":
+            return list(self.queues)
+        # Sorteo ponderado sin reemplazo (clave u^(1/peso))
+        return sorted(self.queues, key=lambda q: random.random() ** (1 / self.queues[q]), reverse=True)
+
+    def read(self, queue, count=1):
+        """Devolver sin esperar hasta ``count`` tareas de una cola como ((cola, message_id), tarea)"""
+        return self._read({queue_key(queue): ">"}, count, None)
+
+    def wait(self, queues, block_ms=5000):
+        """Esperar hasta ``block_ms`` a que llegue algo a alguna de las colas; una tarea por cola"""
+        return self._read({queue_key(queue): ">" for queue in queues}, 1, block_ms)
+
+    def _read(self, streams, count, block_ms):
+        response = self.client.xreadgroup(self.group, self.consumer, streams, count=count, block=block_ms)
+        return [
+            ((_queue_name(stream), message_id), decode_task(fields))
+            for stream, entries in response or []
+            for message_id, fields in entries
+        ]
+
+    def claim_stale(self, count=10, min_idle_ms=CLAIM_IDLE_MS, queues=None):
+        """Tomar tareas que otro worker leyó y no confirmó en ``min_idle_ms``"""
+        messages = []
+        for queue in queues or self.order():
+            _, claimed, *_ = self.client.xautoclaim(
+                queue_key(queue), self.group, self.consumer, min_idle_time=min_idle_ms,
+                start_id="0-0", count=count - len(messages),
+            )
+            messages += [((queue, message_id), decode_task(fields)) for message_id, fields in claimed if fields]
+            if len(messages) >= count:
+                break
+        return messages
+
+    def ack(self, message):
+        """Confirmar una tarea terminada y sacarla de su stream"""
+        queue, message_id = message
+        stream = queue_key(queue)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xack(stream, self.group, message_id)
+        pipe.xdel(stream, message_id)
+        pipe.execute()
+
+
+def _queue_name(stream):
+    if isinstance(stream, bytes):
+        stream = stream.decode()
+    return stream[len(QUEUE_PREFIX):]
+
+
+def store_result(client, task, status, result=None, error=None, runtime=None):
+    """Guardar el resultado de una tarea para consultarlo después"""
+    client.set(result_key(task["id"]), json.dumps({
+        "task": task["task"],
+        "status": status,
+        "result": result,
+        "error": error,
+        "runtime": runtime,
+        "finished_at": datetime.now().isoformat(),
+    }, default=str), ex=RESULT_TTL)
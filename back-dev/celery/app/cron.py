@@ -0,0 +1,134 @@
+"""
+Expresiones cron para el scheduler de beat
+
+Soporta el formato estándar de cinco campos (minuto, hora, día del mes, mes,
+día de la semana) con ``*``, listas, rangos, pasos (``*/4``, ``1-5/2``),
+nombres de mes y de día (``jan``, ``mon``) y los atajos ``@hourly``,
+``@daily``, ``@weekly``, ``@monthly`` y ``@yearly``. Como en cron, si se
+restringen a la vez el día del mes y el de la semana basta con que coincida
+uno de los dos.
+"""
+from datetime import datetime, timedelta
+
+MONTH_NAMES = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+DAY_NAMES = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+# (mínimo, máximo, nombres) de cada campo
+FIELDS = [
+    (0, 59, None),
+    (0, 23, None),
+    (1, 31, None),
+    (1, 12, MONTH_NAMES),
+    (0, 7, DAY_NAMES),
+]
+
+# Años que se buscan como máximo (una expresión como "0 0 30 2 *" nunca ocurre)
+MAX_YEARS = 5
+
+
+class CronError(ValueError):
+    """Expresión cron inválida"""
+
+
+def _value(text, low, names):
+    if names and text.lower() in names:
+        return names.index(text.lower()) + (1 if low == 1 else 0)
+    try:
+        return int(text)
+    except ValueError:
+        raise CronError(f"Valor inválido: {text}")
+
+
+def parse_field(text, low, high, names=None):
+    """Conjunto de valores que admite un campo"""
+    values = set()
+    for part in text.split(","):
+        spec, slash, step = part.partition("/")
+        try:
+            step = int(step) if slash else 1
+        except ValueError:
+            raise CronError(f"Paso inválido: {part}")
+        if step < 1:
+            raise CronError(f"Paso inválido: {part}")
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (_value(v, low, names) for v in spec.split("-", 1))
+        else:
+            start = _value(spec, low, names)
+            # "5/15" equivale a "5-max/15"
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise CronError(f"Fuera de rango ({low}-{high}): {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Expresión cron con cálculo de la siguiente ejecución"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise CronError(f"Se esperaban 5 campos: {expression!r}")
+        try:
+            minutes, hours, days, months, weekdays = [
+                parse_field(text, *spec) for text, spec in zip(fields, FIELDS)
+            ]
+        except CronError as e:
+            raise CronError(f"{e} en {expression!r}") from None
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.days = days
+        self.months = months
+        # 7 también es domingo; Python numera lunes=0, cron domingo=0
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def __repr__(self):
+        return f"CronExpression({self.expression!r})"
+
+    def day_matches(self, moment):
+        in_month = moment.day in self.days
+        in_week = moment.weekday() in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, moment):
+        """Primera ejecución estrictamente posterior a ``moment`` (al minuto)"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate.year + MAX_YEARS
+        while candidate.year <= limit:
+            if candidate.month not in self.months:
+                # Primer día del mes siguiente
+                year, month = divmod(candidate.month, 12)
+                candidate = datetime(candidate.year + year, month + 1, 1, tzinfo=candidate.tzinfo)
+                continue
+            if not self.day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            hour = next((h for h in self.hours if h >= candidate.hour), None)
+            if hour is None:
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour != candidate.hour:
+                candidate = candidate.replace(hour=hour, minute=0)
+            minute = next((m for m in self.minutes if m >= candidate.minute), None)
+            if minute is None:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            return candidate.replace(minute=minute)
+        raise CronError(f"La expresión nunca se cumple: {self.expression!r}")
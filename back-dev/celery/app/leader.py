@@ -0,0 +1,106 @@
+"""
+Elección de líder en Redis para las réplicas de beat
+
+Solo la réplica que tiene el lease (una clave con TTL) encola tareas; las
+demás esperan a que caduque para tomarlo. Cada vez que alguien toma el lease
+recibe un token de fencing nuevo (un contador que solo crece) y el valor de
+la clave es ``holder|token``. Las escrituras del líder se hacen con scripts
+que comprueban ese valor en el mismo paso, así una réplica que se quedó
+colgada más que el TTL no puede escribir al volver aunque aún se crea líder.
+"""
+import logging
+import os
+import socket
+
+logger = logging.getLogger("celery_leader")
+
+LEADER_KEY = "celery:beat:leader"
+EPOCH_KEY = "celery:beat:epoch"
+# Duración del lease; el líder lo renueva cada tercio
+LEASE_TTL_MS = int(os.getenv("CELERY_BEAT_LEASE_TTL_MS", 30000))
+
+# Tomar el lease si está libre y asignarle un token nuevo
+ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. '|' .. token, 'PX', ARGV[2])
+return token
+"""
+
+# Alargar el lease solo si sigue siendo nuestro
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Soltar el lease solo si sigue siendo nuestro
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def default_holder():
+    return os.getenv("CELERY_BEAT_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaderLease:
+    """Lease de líder con token de fencing"""
+
+    def __init__(self, client, key=LEADER_KEY, epoch_key=EPOCH_KEY, ttl_ms=LEASE_TTL_MS, holder=None):
+        self.client = client
+        self.key = key
+        self.epoch_key = epoch_key
+        self.ttl_ms = ttl_ms
+        self.holder = holder or default_holder()
+        self.token = None
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._renew = client.register_script(RENEW_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    @property
+    def is_leader(self):
+        return self.token is not None
+
+    @property
+    def value(self):
+        """Valor de la clave mientras somos líder; los scripts fenced lo comparan"""
+        return f"{self.holder}|{self.token}"
+
+    @property
+    def renew_interval(self):
+        return self.ttl_ms / 3000
+
+    def acquire(self):
+        """Intentar tomar el lease; devuelve True si ahora somos líder"""
+        token = self._acquire(keys=[self.key, self.epoch_key], args=[self.holder, self.ttl_ms])
+        if token:
+            self.token = int(token)
+            logger.info(f"{self.holder} es líder (token {self.token})")
+        return self.is_leader
+
+    def renew(self):
+        """Renovar el lease; si ya no es nuestro se deja de ser líder"""
+        if not self.is_leader:
+            return False
+        if not self._renew(keys=[self.key], args=[self.value, self.ttl_ms]):
+            self.lose()
+        return self.is_leader
+
+    def lose(self):
+        """Marcar el liderazgo como perdido (p. ej. si un script fenced lo rechazó)"""
+        if self.is_leader:
+            logger.warning(f"{self.holder} perdió el liderazgo (token {self.token})")
+        self.token = None
+
+    def release(self):
+        """Soltar el lease para que otra réplica lo tome sin esperar al TTL"""
+        if self.is_leader:
+            self._release(keys=[self.key], args=[self.value])
+            self.token = None
@@ -0,0 +1,148 @@
+"""
+Pool de ejecución del worker
+
+Las tareas de E/S (notificaciones, sincronización, limpieza) corren en un
+pool de hilos y las de CPU (generación de reportes) en un pool de procesos,
+así un reporte largo no bloquea las notificaciones que llegan detrás.
+
+Cada pool tiene sus propios huecos: ``prefetch`` tareas reservadas por hilo o
+proceso (en ejecución o esperando su turno dentro del pool). Además cada tipo
+de tarea puede tener un límite de ejecuciones simultáneas. ``room(tarea)``
+dice cuántas tareas de un tipo caben ahora; el worker no lee de una cola
+mientras sus tareas no tienen sitio, en lugar de traerlas a memoria y ocupar
+los huecos de las demás.
+"""
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger("celery_pool")
+
+
+def timed_call(handler, args, kwargs):
+    """Ejecutar una tarea y devolver (resultado, segundos); corre en el hilo o proceso del pool"""
+    start = time.perf_counter()
+    result = handler(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def parse_limits(text):
+    """Convertir "generate_report=2,sync_external_data=4" en un dict"""
+    limits = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, value = part.partition("=")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+class TaskPool:
+    """Ejecuta tareas en hilos o procesos según su tipo
+
+    ``on_done(message_id, task, result, runtime, error)`` se llama al terminar
+    cada tarea (desde un hilo del pool), antes de liberar su hueco.
+    """
+
+    def __init__(self, handlers, on_done, process_tasks=(), threads=4, processes=1,
+                 limits=None, prefetch=1):
+        self.handlers = handlers
+        self.on_done = on_done
+        self.process_tasks = set(process_tasks) if processes > 0 else set()
+        self.limits = limits or {}
+        self.capacity = {"threads": threads * prefetch, "processes": processes * prefetch}
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="task")
+        self._processes = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+        self._changed = threading.Condition()
+        self._reserved = collections.Counter()
+        self._running = collections.Counter()
+        self._waiting = collections.defaultdict(collections.deque)
+        self.completed = 0
+        self.failed = 0
+
+    def lane(self, name):
+        """Pool ("threads" o "processes") en que corre una tarea"""
+        return "processes" if name in self.process_tasks else "threads"
+
+    def free(self, lane):
+        """Huecos libres de un pool ("threads" o "processes")"""
+        with self._changed:
+            return max(self.capacity[lane] - self._reserved[lane], 0)
+
+    def room(self, name=None):
+        """Cuántas tareas del tipo ``name`` se pueden aceptar ahora"""
+        with self._changed:
+            lane = self.lane(name)
+            free = self.capacity[lane] - self._reserved[lane]
+            limit = self.limits.get(name)
+            if limit is not None:
+                free = min(free, limit - self._running[name] - len(self._waiting[name]))
+            return max(free, 0)
+
+    def wait(self, timeout=None):
+        """Esperar a que termine alguna tarea (o ``timeout`` segundos)"""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def submit(self, message_id, task):
+        """Ejecutar una tarea (o dejarla esperando si su tipo está al límite)"""
+        name = task["task"]
+        with self._changed:
+            limit = self.limits.get(name)
+            if limit is not None and self._running[name] >= limit:
+                self._waiting[name].append((message_id, task))
+                return
+            self._running[name] += 1
+            self._reserved[self.lane(name)] += 1
+        self._start(message_id, task)
+
+    def _start(self, message_id, task):
+        name = task["task"]
+        executor = self._processes if self.lane(name) == "processes" else self._threads
+        future = executor.submit(timed_call, self.handlers[name], task["args"], task["kwargs"])
+        future.add_done_callback(lambda f: self._finished(message_id, task, f))
+
+    def _finished(self, message_id, task, future):
+        name = task["task"]
+        if not future.cancelled():
+            # Si se canceló al apagar queda sin confirmar y la cola la entregará de nuevo
+            self._report(message_id, task, future)
+
+        with self._changed:
+            self._running[name] -= 1
+            self._reserved[self.lane(name)] -= 1
+            waiting = self._waiting[name]
+            following = waiting.popleft() if waiting else None
+            if following is not None:
+                self._running[name] += 1
+                self._reserved[self.lane(name)] += 1
+            self._changed.notify_all()
+        if following is not None:
+            try:
+                self._start(*following)
+            except RuntimeError:
+                # El pool se está apagando: la tarea queda sin confirmar
+                with self._changed:
+                    self._running[name] -= 1
+                    self._reserved[self.lane(name)] -= 1
+
+    def _report(self, message_id, task, future):
+        result = runtime = error = None
+        try:
+            result, runtime = future.result()
+            self.completed += 1
+        except Exception as e:
+            error = e
+            self.failed += 1
+        try:
+            self.on_done(message_id, task, result, runtime, error)
+        except Exception as e:
+            logger.error(f"Error al cerrar la tarea {task['task']} ({task['id']}): {e}")
+
+    def shutdown(self):
+        """Terminar las tareas en curso y descartar las que no empezaron"""
+        with self._changed:
+            self._waiting.clear()
+        self._threads.shutdown(wait=True, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True, cancel_futures=True)
@@ -4,8 +4,14 @@ Simulación de Celery worker para tareas asíncronas
 import os
 import time
 import random
+import signal
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+
+import redis
+
+from broker import TaskConsumer, parse_queues, store_result, tasks_for
+from pool import TaskPool, parse_limits
 
 # Configurar logging
 logging.basicConfig(
@@ -14,14 +20,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger("celery_worker")
 
-# Simular conexión a Redis (broker)
+# Espera máxima de una lectura bloqueante de la cola
+BLOCK_MS = int(os.getenv("CELERY_BLOCK_MS", 5000))
+# Cada cuánto se buscan tareas abandonadas por workers caídos
+CLAIM_INTERVAL = float(os.getenv("CELERY_CLAIM_INTERVAL", 30))
+# Colas que atiende este worker, en orden de prioridad y con peso opcional
+# ("notifications=6,reports=1"). Un worker dedicado usa p. ej. "notifications"
+QUEUES = parse_queues(os.getenv("CELERY_QUEUES", "notifications,reports,sync,maintenance,default"))
+# "strict": una cola solo se atiende si las anteriores están vacías;
+# "weighted": reparto proporcional al peso cuando todas tienen tareas
+QUEUE_PRIORITY = os.getenv("CELERY_QUEUE_PRIORITY", "strict")
+# Hilos para tareas de E/S y procesos para tareas de CPU
+POOL_THREADS = int(os.getenv("CELERY_POOL_THREADS", 8))
+POOL_PROCESSES = int(os.getenv("CELERY_POOL_PROCESSES", 2))
+# Tareas reservadas por cada hilo o proceso (en ejecución o esperando turno en su pool)
+PREFETCH = int(os.getenv("CELERY_PREFETCH", 1))
+# Espera de la lectura bloqueante mientras alguna cola no se lee por falta de
+# huecos: así se vuelve a mirar poco después de que termine una tarea
+HELD_BLOCK_MS = int(os.getenv("CELERY_HELD_BLOCK_MS", 250))
+# Ejecuciones simultáneas por tipo de tarea, p. ej. "generate_report=2,sync_external_data=4"
+TASK_LIMITS = parse_limits(os.getenv("CELERY_TASK_LIMITS", "sync_external_data=4"))
+
+# Conexión a Redis (broker)
 def connect_to_broker():
     redis_host = os.getenv("REDIS_HOST", "localhost")
     redis_port = int(os.getenv("REDIS_PORT", 6379))
     logger.info(f"Conectando a Redis broker en {redis_host}:{redis_port}")
-    # Simulación de conexión
-    time.sleep(1)
-    return True
+    client = redis.Redis(host=redis_host, port=redis_port, db=int(os.getenv("REDIS_DB", 0)))
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        logger.error(f"No se pudo conectar al broker: {e}")
+        return None
+    return client
 
 # Simular conexión a la base de datos
 def connect_to_database():
@@ -73,57 +104,159 @@ class Tasks:
             "space_freed": f"{random.uniform(0.1, 50.0):.2f} MB"
         }
 
-# Simulación de worker de Celery
+    @staticmethod
+    def send_reminders():
+        logger.info("Enviando recordatorios diarios a los oficiales")
+        # Simular envío
+        time.sleep(random.uniform(0.5, 3.0))
+        return {
+            "reminders_sent": random.randint(5, 200)
+        }
+
+# Tareas que el worker acepta, por nombre
+TASK_HANDLERS = {
+    "send_notification": Tasks.send_notification,
+    "generate_report": Tasks.generate_report,
+    "sync_external_data": Tasks.sync_external_data,
+    "clean_old_data": Tasks.clean_old_data,
+    "send_reminders": Tasks.send_reminders,
+}
+
+# Tareas de CPU que van al pool de procesos; el resto usa hilos
+PROCESS_TASKS = ("generate_report",)
+
+def finish_task(client, consumer, message, task, result, runtime, error):
+    """Guardar el resultado de una tarea y confirmarla en la cola"""
+    if error is not None:
+        logger.error(f"Error en tarea {task['task']} ({task['id']}): {error}")
+        store_result(client, task, "FAILURE", error=str(error), runtime=runtime)
+    else:
+        store_result(client, task, "SUCCESS", result=result, runtime=runtime)
+        logger.info(f"Tarea {task['task']} ({task['id']}) completada en {runtime:.2f}s")
+    # Confirmar al terminar: si el worker muere antes, otro la retoma
+    consumer.ack(message)
+
+def reject_unknown(client, consumer, message, task):
+    logger.error(f"Tarea desconocida: {task['task']} ({task['id']})")
+    store_result(client, task, "FAILURE", error=f"Tarea desconocida: {task['task']}")
+    consumer.ack(message)
+
+def queue_room(pool, queue):
+    """Tareas que se pueden leer ahora de una cola (lo que quepa del tipo más lleno)"""
+    return min((pool.room(task) for task in tasks_for(queue) if task in TASK_HANDLERS), default=pool.room())
+
+def wait_queues(pool, queues):
+    """Colas para la lectura bloqueante, que trae una tarea de cada una
+
+    Varias colas pueden ir al mismo pool (notificaciones y mantenimiento usan
+    hilos): solo se espera en tantas como huecos le quedan a ese pool.
+    """
+    free = {}
+    ready = []
+    for queue in queues:
+        lanes = {pool.lane(task) for task in tasks_for(queue) if task in TASK_HANDLERS} or {pool.lane(None)}
+        for lane in lanes:
+            free.setdefault(lane, pool.free(lane))
+        if all(free[lane] > 0 for lane in lanes):
+            for lane in lanes:
+                free[lane] -= 1
+            ready.append(queue)
+    return ready
+
+def dispatch(client, consumer, pool, messages):
+    for message, task in messages:
+        if task["task"] in TASK_HANDLERS:
+            pool.submit(message, task)
+        else:
+            reject_unknown(client, consumer, message, task)
+
+def recover_broker(consumer, error):
+    """Reaccionar a un error del broker en el bucle de lectura"""
+    if isinstance(error, redis.ResponseError) and "NOGROUP" in str(error):
+        # Alguien borró un stream o el consumer group: volver a crearlo y seguir
+        logger.warning(f"Consumer group perdido: {error}. Creándolo de nuevo")
+        try:
+            consumer.ensure_group()
+            return
+        except redis.RedisError as e:
+            error = e
+    # Conexión perdida, timeout, Redis ocupado...: el cliente reconecta en el siguiente comando
+    logger.error(f"Error del broker: {error}. Reintentando en 5s")
+    time.sleep(5)
+
+# Worker: consume tareas de Redis
 def run_worker():
     logger.info("Iniciando Celery worker")
     
     # Conectar a servicios
-    broker_connected = connect_to_broker()
+    client = connect_to_broker()
     db_connected = connect_to_database()
     
-    if not broker_connected or not db_connected:
+    if client is None or not db_connected:
         logger.error("Error conectando a servicios requeridos")
         return False
     
-    logger.info("Worker iniciado y esperando tareas")
-    
-    # Simular procesamiento de tareas
-    tasks = Tasks()
+    consumer = TaskConsumer(client, queues=QUEUES, priority=QUEUE_PRIORITY)
+    consumer.ensure_group()
+    pool = TaskPool(
+        TASK_HANDLERS,
+        lambda message, task, *outcome: finish_task(client, consumer, message, task, *outcome),
+        process_tasks=PROCESS_TASKS,
+        threads=POOL_THREADS,
+        processes=POOL_PROCESSES,
+        limits=TASK_LIMITS,
+        prefetch=PREFETCH,
+    )
+    logger.info(f"Worker {consumer.consumer} iniciado y esperando tareas en {', '.join(QUEUES)} "
+                f"(prioridad {QUEUE_PRIORITY}, {POOL_THREADS} hilos, {POOL_PROCESSES} procesos, prefetch {PREFETCH})")
     
-    while True:
-        # Simular recepción de tareas
-        task_chance = random.random()
-        
-        if task_chance < 0.3:
-            # Tarea de notificación
-            user_id = random.randint(1, 100)
-            messages = [
-                "Nueva asignación de caso",
-                "Actualización en caso #12345",
-                "Reunión programada para mañana",
-                "Alerta de seguridad en sector norte"
-            ]
-            tasks.send_notification(user_id, random.choice(messages))
-            
-        elif task_chance < 0.5:
-            # Tarea de reporte
-            report_types = ["actividad_diaria", "estadisticas_crimenes", "rendimiento_oficiales"]
-            date_range = f"{(datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')} a {datetime.now().strftime('%Y-%m-%d')}"
-            tasks.generate_report(random.choice(report_types), date_range)
-            
-        elif task_chance < 0.6:
-            # Tarea de sincronización
-            sources = ["sistema_nacional", "base_regional", "registro_civil"]
-            tasks.sync_external_data(random.choice(sources))
-            
-        elif task_chance < 0.7:
-            # Tarea de limpieza
-            tasks.clean_old_data(days=random.choice([15, 30, 60, 90]))
-        
-        # Esperar antes de la siguiente iteración
-        time.sleep(random.uniform(5, 15))
+    next_claim = 0.0
+    try:
+        while True:
+            try:
+                # Recuperar de vez en cuando las tareas de workers caídos
+                claim = time.monotonic() >= next_claim
+                if claim:
+                    next_claim = time.monotonic() + CLAIM_INTERVAL
+                received = 0
+                held = set()
+                for queue in consumer.order():
+                    # Una cola cuyas tareas no tienen hueco no se lee: se quedan en
+                    # Redis sin ocupar los huecos de las demás colas
+                    room = queue_room(pool, queue)
+                    if not room:
+                        held.add(queue)
+                        continue
+                    messages = consumer.claim_stale(count=room, queues=[queue]) if claim else []
+                    if len(messages) < room:
+                        messages += consumer.read(queue, room - len(messages))
+                    dispatch(client, consumer, pool, messages)
+                    received += len(messages)
+                if received:
+                    continue
+
+                ready = wait_queues(pool, [queue for queue in QUEUES if queue not in held])
+                if not ready:
+                    # Todos los huecos ocupados: esperar a que termine alguna tarea
+                    pool.wait(HELD_BLOCK_MS / 1000)
+                    continue
+                # Lectura bloqueante: sin tareas no se consume CPU. Si quedan colas
+                # sin esperar por falta de huecos se vuelve a mirar pronto
+                block_ms = HELD_BLOCK_MS if len(ready) < len(QUEUES) else BLOCK_MS
+                messages = consumer.wait(ready, block_ms=block_ms)
+                dispatch(client, consumer, pool, messages)
+            except redis.RedisError as e:
+                recover_broker(consumer, e)
+    finally:
+        logger.info("Esperando a que terminen las tareas en curso")
+        pool.shutdown()
+
+def handle_sigterm(signum, frame):
+    # Kubernetes envía SIGTERM al parar el pod: salir como con Ctrl+C
+    raise KeyboardInterrupt
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, handle_sigterm)
     try:
         run_worker()
     except KeyboardInterrupt:
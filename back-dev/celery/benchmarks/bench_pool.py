@@ -0,0 +1,107 @@
+"""
+Benchmark del pool de ejecución del worker: tareas/segundo según su tamaño
+
+    python benchmarks/bench_pool.py --tasks 400 --configs 1:0 4:1 8:2 16:4
+
+Cada configuración es hilos:procesos. La carga imita la mezcla real a escala
+reducida: notificaciones y sincronizaciones que esperan E/S (sleep) y reportes
+que consumen CPU. No usa Redis: mide solo el pool, con los mismos huecos por
+hilo y proceso (prefetch) que el bucle del worker.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from pool import TaskPool  # noqa: E402
+
+
+def io_task(seconds):
+    time.sleep(seconds)
+    return True
+
+
+def cpu_task(iterations):
+    total = 0
+    for i in range(iterations):
+        total += i * i
+    return total
+
+
+HANDLERS = {"send_notification": io_task, "sync_external_data": io_task, "generate_report": cpu_task}
+
+
+def workload(count, io_seconds, cpu_iterations, seed=11):
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            tasks.append({"id": str(i), "task": "send_notification", "args": [io_seconds], "kwargs": {}})
+        elif kind < 0.85:
+            tasks.append({"id": str(i), "task": "sync_external_data", "args": [io_seconds * 4], "kwargs": {}})
+        else:
+            tasks.append({"id": str(i), "task": "generate_report", "args": [cpu_iterations], "kwargs": {}})
+    return tasks
+
+
+def run_config(tasks, threads, processes, prefetch, limits):
+    done = threading.Event()
+    finished = []
+
+    def on_done(message_id, task, result, runtime, error):
+        finished.append(task)
+        if len(finished) == len(tasks):
+            done.set()
+
+    pool = TaskPool(HANDLERS, on_done, process_tasks=("generate_report",), threads=threads,
+                    processes=processes, limits=limits, prefetch=prefetch)
+    # Calentar el pool de procesos para no medir su arranque
+    if processes:
+        pool._processes.submit(cpu_task, 1).result()
+
+    start = time.perf_counter()
+    pending = list(tasks)
+    while pending:
+        # Como el worker: solo se entregan tareas cuyo pool tiene hueco
+        waiting = []
+        for task in pending:
+            if pool.room(task["task"]):
+                pool.submit(task["id"], task)
+            else:
+                waiting.append(task)
+        pending = waiting
+        if pending:
+            pool.wait(0.05)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return len(tasks) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tareas/segundo según el tamaño del pool")
+    parser.add_argument("--tasks", type=int, default=400)
+    parser.add_argument("--configs", nargs="+", default=["1:0", "4:1", "8:2", "16:4"],
+                        help="hilos:procesos")
+    parser.add_argument("--io-seconds", type=float, default=0.02, help="espera de una notificación")
+    parser.add_argument("--cpu-iterations", type=int, default=300000, help="trabajo de un reporte")
+    parser.add_argument("--prefetch", type=int, default=1, help="tareas reservadas por hilo o proceso")
+    args = parser.parse_args()
+
+    tasks = workload(args.tasks, args.io_seconds, args.cpu_iterations)
+    print(f"{args.tasks} tareas (70% notificaciones, 15% sincronizaciones, 15% reportes)")
+    print(f"{'hilos':>6} {'procesos':>9} {'prefetch':>9} {'tareas/s':>10}")
+    for config in args.configs:
+        threads, processes = (int(value) for value in config.split(":"))
+        # Con 0 procesos los reportes corren en el pool de hilos
+        rate = run_config(tasks, max(threads, 1), processes, args.prefetch, limits=None)
+        print(f"{threads:>6} {processes:>9} {args.prefetch:>9} {rate:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Pruebas de las ejecuciones perdidas de beat y de su política de misfire
+"""
+from datetime import datetime
+
+import pytest
+
+import beat
+from cron import CronExpression
+
+HOURLY = CronExpression("0 * * * *")
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(beat, "MAX_CATCH_UP", 3)
+    monkeypatch.setattr(beat, "MISFIRE_GRACE", 60)
+
+
+def test_missed_runs_window_excludes_last_run_and_includes_now():
+    runs, total = beat.missed_runs(HOURLY, datetime(2024, 6, 1, 8, 0), datetime(2024, 6, 1, 10, 0))
+    assert runs == [datetime(2024, 6, 1, 9, 0), datetime(2024, 6, 1, 10, 0)]
+    assert total == 2
+
+
+def test_missed_runs_none_due():
+    assert beat.missed_runs(HOURLY, datetime(2024, 6, 1, 8, 0), datetime(2024, 6, 1, 8, 59)) == ([], 0)
+
+
+def test_missed_runs_keeps_only_the_latest():
+    runs, total = beat.missed_runs(HOURLY, datetime(2024, 6, 1, 0, 0), datetime(2024, 6, 1, 10, 30))
+    assert total == 10
+    assert runs == [datetime(2024, 6, 1, 8, 0), datetime(2024, 6, 1, 9, 0), datetime(2024, 6, 1, 10, 0)]
+
+
+RUNS = [datetime(2024, 6, 3, 6, 0), datetime(2024, 6, 3, 7, 0), datetime(2024, 6, 3, 8, 0)]
+
+
+@pytest.mark.parametrize("policy", beat.MISFIRE_POLICIES)
+def test_on_time_run_is_sent_by_every_policy(policy):
+    assert beat.plan_runs(policy, RUNS[-1:], datetime(2024, 6, 3, 8, 0, 5)) == RUNS[-1:]
+
+
+def test_coalesce_sends_the_latest_once():
+    assert beat.plan_runs("coalesce", RUNS, datetime(2024, 6, 3, 12, 0)) == RUNS[-1:]
+
+
+def test_catch_up_sends_each_run():
+    assert beat.plan_runs("catch_up", RUNS, datetime(2024, 6, 3, 12, 0)) == RUNS
+
+
+def test_skip_sends_the_latest_only_within_grace():
+    assert beat.plan_runs("skip", RUNS, datetime(2024, 6, 3, 8, 1)) == RUNS[-1:]
+    assert beat.plan_runs("skip", RUNS, datetime(2024, 6, 3, 8, 1, 1)) == []
+
+
+@pytest.mark.parametrize("policy", beat.MISFIRE_POLICIES)
+def test_nothing_pending(policy):
+    assert beat.plan_runs(policy, [], datetime(2024, 6, 3, 8, 0)) == []
+
+
+def test_scheduled_tasks_are_valid():
+    for task in beat.SCHEDULED_TASKS:
+        CronExpression(task["schedule"])
+        assert task.get("misfire", beat.DEFAULT_MISFIRE) in beat.MISFIRE_POLICIES
@@ -0,0 +1,91 @@
+"""
+Pruebas de la recuperación de tareas abandonadas y de los errores del broker (sobre fakeredis)
+"""
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import redis  # noqa: E402
+
+import worker  # noqa: E402
+from broker import TaskConsumer, TaskProducer, queue_key  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+def make_consumer(client, name):
+    consumer = TaskConsumer(client, queues={"notifications": 1.0, "reports": 1.0}, consumer=name)
+    consumer.ensure_group()
+    return consumer
+
+
+def task_ids(messages):
+    return [task["id"] for _, task in messages]
+
+
+def test_stale_tasks_are_claimed_by_another_worker(client):
+    dead, alive = make_consumer(client, "dead"), make_consumer(client, "alive")
+    sent = [TaskProducer(client).send("send_notification", (n, "hola")) for n in range(3)]
+    assert task_ids(dead.read("notifications", 3)) == sent
+
+    claimed = alive.claim_stale(count=10, min_idle_ms=0)
+    assert task_ids(claimed) == sent
+    assert {queue for (queue, _), _ in claimed} == {"notifications"}
+
+
+def test_recent_tasks_are_not_claimed(client):
+    busy, idle = make_consumer(client, "busy"), make_consumer(client, "idle")
+    TaskProducer(client).send("send_notification", (1, "hola"))
+    busy.read("notifications", 1)
+    assert idle.claim_stale(count=10, min_idle_ms=60000) == []
+
+
+def test_acked_tasks_are_not_claimed(client):
+    first, second = make_consumer(client, "first"), make_consumer(client, "second")
+    TaskProducer(client).send("send_notification", (1, "hola"))
+    [(message, _)] = first.read("notifications", 1)
+    first.ack(message)
+    assert second.claim_stale(count=10, min_idle_ms=0) == []
+    assert client.xlen(queue_key("notifications")) == 0
+
+
+def test_claim_respects_count_and_queues(client):
+    dead, alive = make_consumer(client, "dead"), make_consumer(client, "alive")
+    producer = TaskProducer(client)
+    for n in range(3):
+        producer.send("send_notification", (n, "hola"))
+        producer.send("generate_report", ("mensual", "2024-06"))
+    dead.read("notifications", 3)
+    dead.read("reports", 3)
+
+    assert len(alive.claim_stale(count=2, min_idle_ms=0)) == 2
+    reports = alive.claim_stale(count=10, min_idle_ms=0, queues=["reports"])
+    assert [task["task"] for _, task in reports] == ["generate_report"] * 3
+
+
+def test_lost_group_is_recreated(client, monkeypatch):
+    consumer = make_consumer(client, "worker")
+    client.xgroup_destroy(queue_key("notifications"), consumer.group)
+    with pytest.raises(redis.ResponseError) as error:
+        consumer.read("notifications", 1)
+    assert "NOGROUP" in str(error.value)
+
+    slept = []
+    monkeypatch.setattr(worker.time, "sleep", slept.append)
+    worker.recover_broker(consumer, error.value)
+    assert slept == []
+
+    task_id = TaskProducer(client).send("send_notification", (1, "hola"))
+    assert task_ids(consumer.read("notifications", 1)) == [task_id]
+
+
+@pytest.mark.parametrize("error", [redis.ConnectionError("caído"), redis.TimeoutError("lento"),
+                                   redis.ResponseError("BUSY Redis is busy running a script")])
+def test_other_broker_errors_back_off(client, monkeypatch, error):
+    slept = []
+    monkeypatch.setattr(worker.time, "sleep", slept.append)
+    worker.recover_broker(make_consumer(client, "worker"), error)
+    assert slept == [5]
@@ -0,0 +1,98 @@
+"""
+Pruebas del cálculo de próximas ejecuciones de las expresiones cron
+"""
+from datetime import datetime
+
+import pytest
+
+from cron import CronError, CronExpression
+
+
+def runs(expression, start, count=3):
+    cron = CronExpression(expression)
+    moments = []
+    for _ in range(count):
+        start = cron.next_after(start)
+        moments.append(start)
+    return moments
+
+
+def test_next_after_is_strictly_later_and_truncates_seconds():
+    cron = CronExpression("*/15 * * * *")
+    assert cron.next_after(datetime(2024, 6, 1, 10, 0)) == datetime(2024, 6, 1, 10, 15)
+    assert cron.next_after(datetime(2024, 6, 1, 10, 14, 59, 999)) == datetime(2024, 6, 1, 10, 15)
+
+
+def test_hour_day_and_year_rollover():
+    assert runs("0 */4 * * *", datetime(2024, 12, 31, 21, 0)) == [
+        datetime(2025, 1, 1, 0, 0), datetime(2025, 1, 1, 4, 0), datetime(2025, 1, 1, 8, 0),
+    ]
+
+
+def test_month_rollover_skips_short_months():
+    # Solo los meses con día 31
+    assert runs("0 8 31 * *", datetime(2024, 1, 31, 9, 0)) == [
+        datetime(2024, 3, 31, 8, 0), datetime(2024, 5, 31, 8, 0), datetime(2024, 7, 31, 8, 0),
+    ]
+
+
+def test_first_of_month():
+    assert runs("0 8 1 * *", datetime(2024, 1, 15)) == [
+        datetime(2024, 2, 1, 8, 0), datetime(2024, 3, 1, 8, 0), datetime(2024, 4, 1, 8, 0),
+    ]
+
+
+def test_weekday_range():
+    # 2024-06-07 es viernes: el siguiente día laborable es el lunes
+    assert runs("0 8 * * 1-5", datetime(2024, 6, 7, 9, 0), 2) == [
+        datetime(2024, 6, 10, 8, 0), datetime(2024, 6, 11, 8, 0),
+    ]
+
+
+@pytest.mark.parametrize("sunday", ["0", "7", "sun", "SUN"])
+def test_sunday_as_0_7_or_name(sunday):
+    assert CronExpression(f"0 2 * * {sunday}").next_after(datetime(2024, 6, 3)) == datetime(2024, 6, 9, 2, 0)
+
+
+def test_day_of_month_or_day_of_week_when_both_restricted():
+    # Días 1 y 15, y además todos los viernes
+    assert runs("30 4 1,15 * 5", datetime(2024, 5, 31, 23, 59), 4) == [
+        datetime(2024, 6, 1, 4, 30), datetime(2024, 6, 7, 4, 30),
+        datetime(2024, 6, 14, 4, 30), datetime(2024, 6, 15, 4, 30),
+    ]
+
+
+def test_day_of_month_and_day_of_week_when_one_is_wildcard():
+    # Con el día del mes en "*" solo cuenta el día de la semana
+    assert runs("0 0 * * 1", datetime(2024, 6, 1), 2) == [datetime(2024, 6, 3), datetime(2024, 6, 10)]
+
+
+def test_leap_day():
+    assert runs("0 0 29 2 *", datetime(2024, 3, 1), 2) == [datetime(2028, 2, 29), datetime(2032, 2, 29)]
+
+
+def test_names_and_macros():
+    assert CronExpression("0 0 * jan-mar mon").next_after(datetime(2024, 6, 1)) == datetime(2025, 1, 6)
+    assert CronExpression("@hourly").next_after(datetime(2024, 6, 1, 10, 30)) == datetime(2024, 6, 1, 11, 0)
+    assert CronExpression("@weekly").next_after(datetime(2024, 6, 3)) == datetime(2024, 6, 9)
+
+
+def test_impossible_date_raises():
+    with pytest.raises(CronError):
+        CronExpression("0 0 30 2 *").next_after(datetime(2024, 1, 1))
+
+
+@pytest.mark.parametrize("expression", ["* * *", "61 * * * *", "0 24 * * *", "0 0 0 * *", "a * * * *",
+                                        "*/0 * * * *", "5-1 * * * *"])
+def test_invalid_expressions(expression):
+    with pytest.raises(CronError):
+        CronExpression(expression)
+
+
+@pytest.mark.parametrize("expression", ["*/x * * * *", "1-5/ * * * *", "*/ * * * *", "*/1.5 * * * *",
+                                        "0 1-x * * *", "0 -5 * * *", "0 1- * * *", "0 1-2-3 * * *",
+                                        "0,,5 * * * *"])
+def test_malformed_step_or_range(expression):
+    with pytest.raises(CronError) as error:
+        CronExpression(expression)
+    assert repr(expression) in str(error.value)
@@ -0,0 +1,61 @@
+"""
+Pruebas de los huecos del pool y de las colas en que espera el worker
+"""
+import threading
+
+import pytest
+
+import worker
+from pool import TaskPool
+
+QUEUES = ["notifications", "reports", "sync", "maintenance", "default"]
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def make_pool(release, threads=2, processes=1, limits=None):
+    handlers = dict.fromkeys(worker.TASK_HANDLERS, lambda *args, **kwargs: release.wait(5))
+    return TaskPool(handlers, lambda *outcome: None, process_tasks=worker.PROCESS_TASKS,
+                    threads=threads, processes=processes, limits=limits)
+
+
+def task(name, n=0):
+    return {"id": f"{name}-{n}", "task": name, "args": [], "kwargs": {}}
+
+
+def test_free_counts_reserved_slots_per_lane(release):
+    pool = make_pool(release)
+    pool.submit(("notifications", "1-0"), task("send_notification"))
+    assert pool.free("threads") == 1
+    assert pool.free("processes") == 1
+    release.set()
+    pool.shutdown()
+
+
+def test_wait_queues_takes_one_queue_per_free_slot(release):
+    pool = make_pool(release)
+    # Dos hilos: notifications y sync; el proceso: reports
+    assert worker.wait_queues(pool, QUEUES) == ["notifications", "reports", "sync"]
+    pool.shutdown()
+
+
+def test_wait_queues_skips_lanes_without_room(release):
+    pool = make_pool(release)
+    pool.submit(("notifications", "1-0"), task("send_notification"))
+    assert worker.wait_queues(pool, QUEUES) == ["notifications", "reports"]
+    pool.submit(("notifications", "2-0"), task("send_notification", 1))
+    assert worker.wait_queues(pool, QUEUES) == ["reports"]
+    release.set()
+    pool.shutdown()
+
+
+def test_blocking_wait_never_reserves_past_room(release):
+    pool = make_pool(release, threads=1, processes=0)
+    ready = worker.wait_queues(pool, ["notifications", "maintenance", "default"])
+    assert len(ready) <= pool.free("threads") == 1
+    pool.shutdown()
@@ -0,0 +1,92 @@
+"""
+Caché de respuestas en proceso para los listados de oficiales y casos
+
+Guarda el cuerpo ya serializado (bytes) junto con su ETag, de modo que una
+petición repetida no toca Redis ni vuelve a serializar nada, y un cliente que
+envía ``If-None-Match`` con el ETag vigente recibe un 304 directamente.
+
+Las escrituras invalidan la colección afectada en este proceso y publican la
+invalidación en Redis para que el resto de réplicas hagan lo mismo.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+
+class CachedResponse:
+    """Respuesta serializada lista para reenviar"""
+
+    __slots__ = ("body", "etag", "headers", "expires_at")
+
+    def __init__(self, body: bytes, headers: Dict[str, str], ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.headers = {**headers, "ETag": self.etag}
+        self.expires_at = time.monotonic() + ttl
+
+    def to_response(self, if_none_match: Optional[str] = None) -> Response:
+        if if_none_match and self.etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers={"ETag": self.etag})
+        return Response(content=self.body, media_type="application/json", headers=self.headers)
+
+
+class ResponseCache:
+    """Caché LRU por colección con número de generación para invalidar"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        # Veces que se vació todo; cuenta en la generación de todas las colecciones,
+        # también las que aún no tienen entradas ni invalidaciones
+        self._cleared = 0
+
+    @staticmethod
+    def request_key(collection: str, request: Request) -> tuple:
+        # Normalizar el orden de los parámetros para que ?a=1&b=2 y ?b=2&a=1 compartan entrada
+        return (collection, request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+    def generation(self, collection: str) -> int:
+        return self._cleared + self._generations.get(collection, 0)
+
+    def get(self, collection: str, request: Request) -> Optional[CachedResponse]:
+        key = self.request_key(collection, request)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, collection: str, request: Request, generation: int,
+            content, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        """Serializar y guardar una respuesta
+
+        Si la colección se invalidó mientras se leía de Redis (la generación
+        cambió), la respuesta se devuelve pero no se guarda.
+        """
+        body = json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        entry = CachedResponse(body, headers or {}, self.ttl)
+        if generation == self.generation(collection):
+            self._entries[self.request_key(collection, request)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, collection: str):
+        """Descartar todas las respuestas de una colección"""
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        for key in [key for key in self._entries if key[0] == collection]:
+            del self._entries[key]
+
+    def clear(self):
+        """Descartar todo (p. ej. tras perder invalidaciones de otras réplicas)"""
+        self._cleared += 1
+        self._entries.clear()
@@ -0,0 +1,60 @@
+"""
+Exportación en streaming de registros (NDJSON o CSV)
+
+Los registros se leen por bloques con ``RecordStore.scan`` y se emiten a
+medida que llegan, así que la memoria del pod no depende del tamaño de la
+exportación. Los filtros se resuelven en Redis: el rango de fechas sobre el
+índice temporal y el estado sobre su índice secundario. Con los dos, cada
+bloque del rango de fechas se cruza con el índice de estado antes de leer
+los registros.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from storage import RecordStore, timestamp
+
+EXPORT_CHUNK_SIZE = 500
+
+
+async def iter_cases(store: RecordStore, status: Optional[str] = None,
+                     since: Optional[datetime] = None,
+                     until: Optional[datetime] = None) -> AsyncIterator[Dict]:
+    """Recorrer los casos que cumplen los filtros"""
+    status_key = store.field_index_key("status", status) if status else None
+    if since or until:
+        records = store.scan(
+            store.time_index_key("created_at"),
+            min_score=timestamp(since) if since else "-inf",
+            max_score=timestamp(until) if until else "+inf",
+            chunk_size=EXPORT_CHUNK_SIZE,
+            member_of=status_key,
+        )
+    else:
+        records = store.scan(status_key, chunk_size=EXPORT_CHUNK_SIZE)
+    async for record in records:
+        yield record
+
+
+async def ndjson_stream(records: AsyncIterator[Dict]) -> AsyncIterator[bytes]:
+    async for record in records:
+        yield json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+async def csv_stream(records: AsyncIterator[Dict], fields: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    async for record in records:
+        if isinstance(record.get("assigned_to"), list):
+            # Copia: el registro puede venir de una caché o de otro consumidor
+            record = {**record, "assigned_to": ";".join(str(officer_id) for officer_id in record["assigned_to"])}
+        writer.writerow(record)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Vaciar la cabecera si no hubo registros
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
@@ -2,14 +2,26 @@
 Simulación de Django API usando FastAPI
 """
 import os
+import asyncio
+import logging
+import uuid
 from typing import Dict, List, Optional
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
 import redis
-import json
+import redis.asyncio as aioredis
+
+from bulk import bulk_import
+from cache import ResponseCache
+from export import csv_stream, iter_cases, ndjson_stream
+from stats import case_counters, officer_counters, read_stats
+from storage import RecordStore
+
+logger = logging.getLogger("django_api")
 
 # Inicializar aplicación
 app = FastAPI(title="SmartPoli API", description="API de gestión policial", version="1.0.0")
@@ -23,10 +35,111 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Conexión a Redis
+# Conexión a Redis: un pool compartido por todas las peticiones del proceso.
+# Con todas las conexiones ocupadas, una petición espera hasta REDIS_POOL_TIMEOUT
+# a que se libere una en lugar de fallar de inmediato
 redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = int(os.getenv("REDIS_PORT", 6379))
-redis_client = redis.Redis(host=redis_host, port=redis_port, db=0)
+redis_pool = aioredis.BlockingConnectionPool(
+    host=redis_host,
+    port=redis_port,
+    db=0,
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 50)),
+    timeout=float(os.getenv("REDIS_POOL_TIMEOUT", 5.0)),
+    socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 2.0)),
+    socket_connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT", 2.0)),
+    decode_responses=True,
+)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+# Colecciones con un hash por registro
+officer_store = RecordStore(redis_client, "officers", indexed_fields=("department", "active"))
+case_store = RecordStore(
+    redis_client, "cases", indexed_fields=("status", "assigned_to"), time_indexed_fields=("created_at",)
+)
+
+# Paginación por cursor
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+
+# Tamaño de lote para las importaciones masivas
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 500))
+
+# Caché de respuestas de listados, invalidada entre réplicas por pub/sub
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_ENTRIES", 1024)),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", 30)),
+)
+CACHE_INVALIDATION_CHANNEL = "api_cache_invalidation"
+INSTANCE_ID = uuid.uuid4().hex
+
+def page_response(request: Request, collection: str, generation: int,
+                  items: List[Dict], next_cursor: Optional[int]):
+    """Serializar una página una sola vez y guardarla en caché
+
+    Los registros ya se validaron al crearse, así que no se revalidan con
+    Pydantic; el cursor de la siguiente página viaja en ``X-Next-Cursor``.
+    """
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else {}
+    entry = response_cache.put(collection, request, generation, items, headers)
+    return entry.to_response(request.headers.get("if-none-match"))
+
+def bulk_response(result: Dict):
+    """Resultado de una importación masiva; si Redis falló a mitad se responde
+    503 con lo que sí se creó y la fila desde la que reintentar"""
+    if result["status"] != "completed":
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=result)
+    return result
+
+async def invalidate_cache(collection: str):
+    """Invalidar la caché local y avisar al resto de réplicas"""
+    response_cache.invalidate(collection)
+    try:
+        await redis_client.publish(CACHE_INVALIDATION_CHANNEL, f"{INSTANCE_ID}:{collection}")
+    except redis.RedisError as e:
+        logger.warning(f"No se pudo publicar la invalidación de {collection}: {e}")
+
+async def listen_for_invalidations():
+    """Aplicar las invalidaciones publicadas por otras réplicas"""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            # Mientras estuvimos desconectados pudimos perder invalidaciones
+            response_cache.clear()
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                origin, _, collection = message["data"].partition(":")
+                if origin != INSTANCE_ID:
+                    response_cache.invalidate(collection)
+        except redis.RedisError as e:
+            logger.warning(f"Suscripción de invalidación interrumpida: {e}")
+            response_cache.clear()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.reset()
+
+@app.on_event("startup")
+async def migrate_legacy_data():
+    """Migrar las listas JSON heredadas al almacenamiento por registro"""
+    try:
+        await officer_store.migrate_legacy_blob(on_write=officer_counters)
+        await case_store.migrate_legacy_blob(on_write=case_counters)
+    except redis.RedisError:
+        pass
+
+@app.on_event("startup")
+async def start_cache_invalidation():
+    """Iniciar el suscriptor de invalidaciones de caché"""
+    app.state.invalidation_task = asyncio.create_task(listen_for_invalidations())
+
+@app.on_event("shutdown")
+async def close_redis_pool():
+    """Cerrar las conexiones del pool de Redis"""
+    app.state.invalidation_task.cancel()
+    await redis_pool.disconnect()
 
 # Modelos de datos
 class Officer(BaseModel):
@@ -44,109 +157,168 @@ class Case(BaseModel):
     description: str
     status: str
     assigned_to: List[int]
-    created_at: datetime = datetime.now()
-    updated_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
 
 # Rutas para oficiales
 @app.get("/api/officers/", response_model=List[Officer])
-def get_officers():
-    """Listar todos los oficiales"""
+async def get_officers(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Cursor: id del último oficial de la página anterior"),
+    department: Optional[str] = None,
+    active: Optional[bool] = None,
+):
+    """Listar oficiales paginados por cursor"""
+    cached = response_cache.get("officers", request)
+    if cached:
+        return cached.to_response(request.headers.get("if-none-match"))
+
+    generation = response_cache.generation("officers")
     try:
-        officers_data = redis_client.get("officers")
-        if not officers_data:
-            return []
-        return json.loads(officers_data)
-    except:
-        # Simulación fallback
-        return [
-            {"id": 1, "badge_number": "12345", "name": "John Doe", "rank": "Detective", "department": "Homicide", "active": True},
-            {"id": 2, "badge_number": "67890", "name": "Jane Smith", "rank": "Officer", "department": "Patrol", "active": True},
-        ]
+        items, next_cursor = await officer_store.page(
+            limit, after, filters={"department": department, "active": active}
+        )
+        return page_response(request, "officers", generation, items, next_cursor)
+    except redis.RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Almacenamiento no disponible")
 
 @app.post("/api/officers/", response_model=Officer, status_code=status.HTTP_201_CREATED)
-def create_officer(officer: Officer):
+async def create_officer(officer: Officer):
     """Crear un nuevo oficial"""
     try:
-        # Simulación de ID autogenerado
-        officers_data = redis_client.get("officers")
-        officers = json.loads(officers_data) if officers_data else []
-        
-        new_id = max([o.get("id", 0) for o in officers], default=0) + 1
-        officer.id = new_id
-        
-        officers.append(officer.dict())
-        redis_client.set("officers", json.dumps(officers))
-        return officer
-    except:
-        # Simulación sin Redis
-        officer.id = 3  # Simulado
-        return officer
+        # ID autogenerado con INCR atómico
+        officer.id = (await officer_store.create(officer.dict(), on_write=officer_counters))["id"]
+    except redis.RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Almacenamiento no disponible")
+    await invalidate_cache("officers")
+    return officer
+
+@app.post("/api/officers/bulk")
+async def bulk_create_officers(request: Request):
+    """Crear oficiales en masa desde un array JSON o NDJSON"""
+    try:
+        result = await bulk_import(request, Officer, officer_store, officer_counters, BULK_BATCH_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        await invalidate_cache("officers")
+    return bulk_response(result)
+
+@app.put("/api/officers/{officer_id}", response_model=Officer)
+async def update_officer(officer_id: int, officer: Officer):
+    """Actualizar un oficial"""
+    try:
+        updated = await officer_store.update(officer_id, officer.dict(exclude={"id"}), on_write=officer_counters)
+    except redis.RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Almacenamiento no disponible")
+    if updated is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Oficial no encontrado")
+    await invalidate_cache("officers")
+    return updated
 
 # Rutas para casos
 @app.get("/api/cases/", response_model=List[Case])
-def get_cases():
-    """Listar todos los casos"""
+async def get_cases(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Cursor: id del último caso de la página anterior"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    assigned_to: Optional[int] = None,
+):
+    """Listar casos paginados por cursor"""
+    cached = response_cache.get("cases", request)
+    if cached:
+        return cached.to_response(request.headers.get("if-none-match"))
+
+    generation = response_cache.generation("cases")
     try:
-        cases_data = redis_client.get("cases")
-        if not cases_data:
-            return []
-        return json.loads(cases_data)
-    except:
-        # Simulación fallback
-        return [
-            {
-                "id": 1, 
-                "case_number": "CP-2025-001", 
-                "title": "Robo en tienda", 
-                "description": "Robo reportado en tienda central",
-                "status": "Abierto",
-                "assigned_to": [1, 2],
-                "created_at": "2025-06-15T10:30:00",
-                "updated_at": "2025-06-15T10:30:00"
-            }
-        ]
+        items, next_cursor = await case_store.page(
+            limit, after, filters={"status": status_filter, "assigned_to": assigned_to}
+        )
+        return page_response(request, "cases", generation, items, next_cursor)
+    except redis.RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Almacenamiento no disponible")
 
 @app.post("/api/cases/", response_model=Case, status_code=status.HTTP_201_CREATED)
-def create_case(case: Case):
+async def create_case(case: Case):
     """Crear un nuevo caso"""
     try:
-        # Simulación de ID autogenerado
-        cases_data = redis_client.get("cases")
-        cases = json.loads(cases_data) if cases_data else []
-        
-        new_id = max([c.get("id", 0) for c in cases], default=0) + 1
-        case.id = new_id
-        
-        cases.append(case.dict())
-        redis_client.set("cases", json.dumps(cases))
-        return case
-    except:
-        # Simulación sin Redis
-        case.id = 2  # Simulado
-        return case
+        # ID autogenerado con INCR atómico
+        case.id = (await case_store.create(case.dict(), on_write=case_counters))["id"]
+    except redis.RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Almacenamiento no disponible")
+    await invalidate_cache("cases")
+    return case
+
+@app.get("/api/cases/export")
+async def export_cases(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    since: Optional[datetime] = Query(None, description="Casos creados desde esta fecha"),
+    until: Optional[datetime] = Query(None, description="Casos creados hasta esta fecha"),
+):
+    """Exportar casos en streaming como NDJSON o CSV"""
+    records = iter_cases(case_store, status=status_filter, since=since, until=until)
+    if format == "csv":
+        return StreamingResponse(
+            csv_stream(records, list(Case.__fields__)),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="cases.csv"'},
+        )
+    return StreamingResponse(ndjson_stream(records), media_type="application/x-ndjson")
+
+@app.post("/api/cases/bulk")
+async def bulk_create_cases(request: Request):
+    """Crear casos en masa desde un array JSON o NDJSON"""
+    try:
+        result = await bulk_import(request, Case, case_store, case_counters, BULK_BATCH_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        await invalidate_cache("cases")
+    return bulk_response(result)
+
+@app.put("/api/cases/{case_id}", response_model=Case)
+async def update_case(case_id: int, case: Case):
+    """Actualizar un caso"""
+    changes = case.dict(exclude={"id", "created_at"})
+    changes["updated_at"] = datetime.now()
+    try:
+        updated = await case_store.update(case_id, changes, on_write=case_counters)
+    except redis.RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Almacenamiento no disponible")
+    if updated is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Caso no encontrado")
+    await invalidate_cache("cases")
+    return updated
 
 # Ruta para estadísticas
 @app.get("/api/stats/")
-def get_stats():
+async def get_stats():
     """Obtener estadísticas del sistema"""
-    return {
-        "total_officers": 25,
-        "active_officers": 23,
-        "total_cases": 156,
-        "open_cases": 42,
-        "cases_this_month": 15,
-        "response_time_avg": "45 minutos"
-    }
+    try:
+        return await read_stats(redis_client)
+    except redis.RedisError:
+        # Simulación sin Redis
+        return {
+            "total_officers": 25,
+            "active_officers": 23,
+            "total_cases": 156,
+            "open_cases": 42,
+            "cases_this_month": 15,
+            "response_time_avg": "45 minutos"
+        }
 
 # Ruta para healthcheck
 @app.get("/health")
-def health_check():
+async def health_check():
     """Verificar estado de la API"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 # Ruta para admin (simulación de Django admin)
 @app.get("/admin/login/")
-def admin_login():
+async def admin_login():
     """Simulación de página de login del admin"""
     return {"message": "Admin login page"}
 
@@ -0,0 +1,67 @@
+"""
+Contadores incrementales para ``/api/stats/``
+
+Las rutas de creación y actualización ajustan los contadores dentro de la
+misma transacción que escribe el registro, así que leer las estadísticas es
+una sola lectura en pipeline, sin recorrer oficiales ni casos.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+STATS_KEY = "stats"
+OPEN_STATUSES = {"Abierto"}
+
+
+def _parse_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def month_key(moment: datetime) -> str:
+    return f"{STATS_KEY}:cases:{moment.strftime('%Y-%m')}"
+
+
+def officer_counters(pipe, old: Optional[Dict], new: Dict):
+    """Ajustar total y activos de oficiales"""
+    if old is None:
+        pipe.hincrby(STATS_KEY, "total_officers", 1)
+    delta = int(bool(new.get("active"))) - int(bool(old and old.get("active")))
+    if delta:
+        pipe.hincrby(STATS_KEY, "active_officers", delta)
+
+
+def case_counters(pipe, old: Optional[Dict], new: Dict):
+    """Ajustar total, abiertos, casos del mes y tiempo de respuesta"""
+    was_open = old is not None and old.get("status") in OPEN_STATUSES
+    is_open = new.get("status") in OPEN_STATUSES
+
+    if old is None:
+        pipe.hincrby(STATS_KEY, "total_cases", 1)
+        pipe.incr(month_key(_parse_datetime(new["created_at"])))
+    if is_open != was_open:
+        pipe.hincrby(STATS_KEY, "open_cases", 1 if is_open else -1)
+
+    # Tiempo de respuesta: desde la creación hasta que el caso deja de estar abierto
+    if was_open and not is_open:
+        elapsed = _parse_datetime(new["updated_at"]) - _parse_datetime(new["created_at"])
+        pipe.hincrbyfloat(STATS_KEY, "response_time_total", elapsed.total_seconds() / 60)
+        pipe.hincrby(STATS_KEY, "response_time_count", 1)
+
+
+async def read_stats(client, now: Optional[datetime] = None) -> Dict:
+    """Leer todas las estadísticas en un solo viaje a Redis"""
+    now = now or datetime.now()
+    pipe = client.pipeline(transaction=False)
+    pipe.hgetall(STATS_KEY)
+    pipe.get(month_key(now))
+    counters, this_month = await pipe.execute()
+
+    count = int(counters.get("response_time_count", 0))
+    average = float(counters.get("response_time_total", 0)) / count if count else 0
+    return {
+        "total_officers": int(counters.get("total_officers", 0)),
+        "active_officers": int(counters.get("active_officers", 0)),
+        "total_cases": int(counters.get("total_cases", 0)),
+        "open_cases": int(counters.get("open_cases", 0)),
+        "cases_this_month": int(this_month or 0),
+        "response_time_avg": f"{average:.0f} minutos",
+    }
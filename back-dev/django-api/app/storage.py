@@ -0,0 +1,270 @@
+"""
+Almacenamiento por registro en Redis para la simulación de Django API
+
+Cada registro vive en su propio hash (``officers:<id>``), los ids salen de una
+secuencia atómica (``INCR officers:seq``) y el listado se apoya en un índice
+ZSET (``officers:index``) ordenado por id. Crear un registro cuesta O(1) y dos
+réplicas de la API ya no se pisan las escrituras. Todas las operaciones usan
+el cliente ``redis.asyncio`` para no bloquear el event loop.
+
+Los campos filtrables tienen índices secundarios, también ZSET por id
+(``cases:idx:status:Abierto``), de modo que una página filtrada se obtiene con
+``ZRANGEBYSCORE`` desde el cursor sin recorrer la colección. Los campos de
+fecha indexados (``cases:idx:created_at``) usan el timestamp como score para
+poder filtrar por rango de tiempo.
+"""
+import json
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+# Gancho que añade comandos a la misma transacción que escribe el registro:
+# on_write(pipe, registro_anterior, registro_nuevo)
+WriteHook = Callable[[object, Optional[Dict], Dict], None]
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def encode_record(record: Dict) -> Dict[str, str]:
+    """Codificar cada campo del registro como JSON para guardarlo en un hash"""
+    return {field: json.dumps(value, default=_default) for field, value in record.items()}
+
+
+def decode_record(raw: Dict) -> Dict:
+    """Reconstruir un registro a partir de los campos del hash"""
+    return {field: json.loads(value) for field, value in raw.items()}
+
+
+def index_value(value) -> str:
+    """Normalizar un valor para usarlo en el nombre de un índice"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def timestamp(value: Union[datetime, str]) -> float:
+    """Convertir una fecha (o su ISO 8601) en el score de un índice temporal"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+class RecordStore:
+    """Colección de registros en Redis con un hash por registro"""
+
+    def __init__(self, client, collection: str, indexed_fields: Iterable[str] = (),
+                 time_indexed_fields: Iterable[str] = ()):
+        self.client = client
+        self.collection = collection
+        self.indexed_fields = tuple(indexed_fields)
+        self.time_indexed_fields = tuple(time_indexed_fields)
+        self.seq_key = f"{collection}:seq"
+        self.index_key = f"{collection}:index"
+
+    def record_key(self, record_id: int) -> str:
+        return f"{self.collection}:{record_id}"
+
+    def field_index_key(self, field: str, value) -> str:
+        return f"{self.collection}:idx:{field}:{index_value(value)}"
+
+    def time_index_key(self, field: str) -> str:
+        return f"{self.collection}:idx:{field}"
+
+    def _field_index_keys(self, record: Dict) -> List[str]:
+        keys = []
+        for field in self.indexed_fields:
+            value = record.get(field)
+            # Los campos lista (p. ej. assigned_to) se indexan por cada elemento
+            values = value if isinstance(value, list) else [value]
+            keys.extend(self.field_index_key(field, v) for v in values if v is not None)
+        return keys
+
+    def _write(self, pipe, record: Dict):
+        record_id = record["id"]
+        pipe.hset(self.record_key(record_id), mapping=encode_record(record))
+        pipe.zadd(self.index_key, {record_id: record_id})
+        for key in self._field_index_keys(record):
+            pipe.zadd(key, {record_id: record_id})
+        for field in self.time_indexed_fields:
+            if record.get(field) is not None:
+                pipe.zadd(self.time_index_key(field), {record_id: timestamp(record[field])})
+
+    async def create(self, record: Dict, on_write: Optional[WriteHook] = None) -> Dict:
+        """Crear un registro con id autogenerado"""
+        record["id"] = await self.client.incr(self.seq_key)
+
+        pipe = self.client.pipeline(transaction=True)
+        self._write(pipe, record)
+        if on_write:
+            on_write(pipe, None, record)
+        await pipe.execute()
+        return record
+
+    async def create_many(self, records: List[Dict],
+                          on_write: Optional[WriteHook] = None) -> List[Dict]:
+        """Crear varios registros reservando el rango de ids con un solo INCRBY
+
+        Todas las escrituras van en una única transacción en pipeline, así que
+        un lote cuesta dos viajes a Redis sin importar su tamaño.
+        """
+        if not records:
+            return []
+        last_id = await self.client.incrby(self.seq_key, len(records))
+        first_id = last_id - len(records) + 1
+
+        pipe = self.client.pipeline(transaction=True)
+        for record_id, record in enumerate(records, start=first_id):
+            record["id"] = record_id
+            self._write(pipe, record)
+            if on_write:
+                on_write(pipe, None, record)
+        await pipe.execute()
+        return records
+
+    async def update(self, record_id: int, changes: Dict,
+               on_write: Optional[WriteHook] = None) -> Optional[Dict]:
+        """Actualizar un registro manteniendo sus índices
+
+        Usa WATCH sobre el hash del registro para que dos réplicas que
+        actualizan el mismo registro no dejen índices inconsistentes.
+        """
+        key = self.record_key(record_id)
+
+        async def apply(pipe):
+            raw = await pipe.hgetall(key)
+            if not raw:
+                return None
+            old = decode_record(raw)
+            new = {**old, **changes, "id": record_id}
+            pipe.multi()
+            for stale_key in set(self._field_index_keys(old)) - set(self._field_index_keys(new)):
+                pipe.zrem(stale_key, record_id)
+            self._write(pipe, new)
+            if on_write:
+                on_write(pipe, old, new)
+            return new
+
+        return await self.client.transaction(apply, key, value_from_callable=True)
+
+    async def get(self, record_id: int) -> Optional[Dict]:
+        """Obtener un registro por id"""
+        raw = await self.client.hgetall(self.record_key(record_id))
+        return decode_record(raw) if raw else None
+
+    async def get_many(self, record_ids: List[int]) -> List[Dict]:
+        """Obtener varios registros en un solo viaje a Redis"""
+        pipe = self.client.pipeline(transaction=False)
+        for record_id in record_ids:
+            pipe.hgetall(self.record_key(record_id))
+        return [decode_record(raw) for raw in await pipe.execute() if raw]
+
+    async def list(self) -> List[Dict]:
+        """Listar todos los registros ordenados por id"""
+        record_ids = await self.client.zrange(self.index_key, 0, -1)
+        return await self.get_many(record_ids)
+
+    async def page(self, limit: int, after: Optional[int] = None,
+             filters: Optional[Dict] = None) -> Tuple[List[Dict], Optional[int]]:
+        """Obtener una página de registros con id mayor que ``after``
+
+        Devuelve los registros y el cursor de la siguiente página (``None`` si
+        no hay más). Con varios filtros se recorre el índice más selectivo y el
+        resto se comprueba sobre los registros leídos.
+        """
+        filters = {field: value for field, value in (filters or {}).items() if value is not None}
+        index_key = self.index_key
+        if filters:
+            candidates = [(field, self.field_index_key(field, value)) for field, value in filters.items()]
+            pipe = self.client.pipeline(transaction=False)
+            for _, key in candidates:
+                pipe.zcard(key)
+            sizes = await pipe.execute()
+            field, index_key = min(zip(candidates, sizes), key=lambda item: item[1])[0]
+            del filters[field]
+
+        items: List[Dict] = []
+        lower = f"({after}" if after is not None else "-inf"
+        while len(items) <= limit:
+            chunk = await self.client.zrangebyscore(index_key, lower, "+inf", start=0, num=limit + 1)
+            if not chunk:
+                break
+            for record in await self.get_many(chunk):
+                if all(self._matches(record, field, value) for field, value in filters.items()):
+                    items.append(record)
+            if len(chunk) <= limit:
+                break
+            lower = f"({chunk[-1]}"
+
+        if len(items) > limit:
+            items = items[:limit]
+            return items, items[-1]["id"]
+        return items, None
+
+    async def scan(self, index_key: Optional[str] = None, min_score="-inf", max_score="+inf",
+                   chunk_size: int = 500, member_of: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Recorrer los registros de un índice en orden de score, por bloques
+
+        Solo hay un bloque en memoria a la vez. El cursor avanza por score; los
+        registros que comparten el último score de un bloque se leen juntos
+        para no perder ni repetir ninguno. Con ``member_of`` cada bloque de ids
+        se cruza con ese otro índice (ZMSCORE) y solo se leen los que están en
+        los dos.
+        """
+        index_key = index_key or self.index_key
+        lower = min_score
+        while True:
+            chunk = await self.client.zrangebyscore(
+                index_key, lower, max_score, start=0, num=chunk_size, withscores=True
+            )
+            if not chunk:
+                return
+            last_score = chunk[-1][1]
+            record_ids = [record_id for record_id, score in chunk if score < last_score]
+            if len(chunk) < chunk_size:
+                record_ids = [record_id for record_id, _ in chunk]
+            else:
+                record_ids += await self.client.zrangebyscore(index_key, last_score, last_score)
+            if member_of is not None:
+                scores = await self.client.zmscore(member_of, record_ids)
+                record_ids = [record_id for record_id, score in zip(record_ids, scores) if score is not None]
+            for record in await self.get_many(record_ids):
+                yield record
+            if len(chunk) < chunk_size:
+                return
+            lower = f"({last_score}"
+
+    @staticmethod
+    def _matches(record: Dict, field: str, value) -> bool:
+        current = record.get(field)
+        if isinstance(current, list):
+            return value in current
+        return index_value(current) == index_value(value)
+
+    async def migrate_legacy_blob(self, on_write: Optional[WriteHook] = None) -> int:
+        """Importar la lista JSON heredada (clave ``officers``/``cases``) al esquema por registro
+
+        Usa WATCH sobre la clave heredada y la secuencia: si dos réplicas
+        arrancan a la vez, solo una importa la lista (y ``on_write`` cuenta cada
+        registro una vez); la otra reintenta y ya no la encuentra.
+        """
+        async def apply(pipe):
+            if await pipe.type(self.collection) != "string":
+                return 0
+            records = json.loads(await pipe.get(self.collection) or "[]")
+            current = int(await pipe.get(self.seq_key) or 0)
+            max_id = max((int(record["id"]) for record in records), default=0)
+            pipe.multi()
+            for record in records:
+                self._write(pipe, record)
+                if on_write:
+                    on_write(pipe, None, record)
+            pipe.delete(self.collection)
+            # La secuencia nunca debe retroceder por debajo de los ids importados
+            if max_id > current:
+                pipe.set(self.seq_key, max_id)
+            return len(records)
+
+        return await self.client.transaction(apply, self.collection, self.seq_key, value_from_callable=True)
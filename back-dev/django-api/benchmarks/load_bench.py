@@ -0,0 +1,93 @@
+"""
+Benchmark de carga para la simulación de Django API
+
+Lanza N clientes concurrentes contra la API durante un tiempo fijo y reporta
+peticiones/segundo y latencias. Para comparar antes/después se ejecuta contra
+cada versión del servidor con los mismos parámetros:
+
+    python benchmarks/load_bench.py --url http://localhost:8000 --concurrency 200 --duration 20
+
+Con ``--write-ratio`` una fracción de las peticiones crea casos en lugar de
+listarlos.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import aiohttp
+
+READ_PATHS = ["/api/officers/?limit=50", "/api/cases/?limit=50", "/api/stats/"]
+
+
+def sample_case(i):
+    return {
+        "case_number": f"BENCH-{i}",
+        "title": "Caso de benchmark",
+        "description": "Generado por load_bench.py",
+        "status": "Abierto",
+        "assigned_to": [1],
+    }
+
+
+async def client_loop(session, base_url, deadline, write_ratio, latencies, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        i += 1
+        start = time.perf_counter()
+        try:
+            if random.random() < write_ratio:
+                request = session.post(f"{base_url}/api/cases/", json=sample_case(i))
+            else:
+                request = session.get(f"{base_url}{random.choice(READ_PATHS)}")
+            async with request as response:
+                await response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+async def warm_up(session, base_url):
+    async with session.get(f"{base_url}/health") as response:
+        await response.read()
+
+
+async def run(args):
+    latencies, errors = [], []
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Calentar conexiones antes de medir
+        await asyncio.gather(*(warm_up(session, args.url) for _ in range(min(args.concurrency, 20))))
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(session, args.url, deadline, args.write_ratio, latencies, errors)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"Concurrencia:   {args.concurrency}")
+    print(f"Peticiones:     {len(latencies)} en {elapsed:.1f}s")
+    print(f"Throughput:     {len(latencies) / elapsed:.0f} req/s")
+    print(f"Latencia media: {statistics.mean(latencies) * 1000:.1f} ms")
+    print(f"Latencia p50:   {p(0.50):.1f} ms")
+    print(f"Latencia p99:   {p(0.99):.1f} ms")
+    print(f"Errores:        {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga de la API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
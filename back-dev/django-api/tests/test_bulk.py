@@ -0,0 +1,105 @@
+"""
+Pruebas de la importación masiva por lotes y de su fallo a mitad (sobre fakeredis)
+"""
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import redis  # noqa: E402
+from pydantic import BaseModel  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from bulk import bulk_import  # noqa: E402
+from stats import STATS_KEY, officer_counters  # noqa: E402
+from storage import RecordStore  # noqa: E402
+
+
+class Row(BaseModel):
+    name: str
+    active: bool = True
+
+
+def make_request(rows, ndjson=False):
+    if ndjson:
+        body, content_type = "\n".join(json.dumps(row) for row in rows).encode(), b"application/x-ndjson"
+    else:
+        body, content_type = json.dumps(rows).encode(), b"application/json"
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({"type": "http", "method": "POST", "headers": [(b"content-type", content_type)]}, receive)
+
+
+def make_store():
+    return RecordStore(fakeredis.FakeAsyncRedis(decode_responses=True), "officers", indexed_fields=("active",))
+
+
+def fail_on_batch(monkeypatch, store, failing_batch):
+    """Hacer que el lote número ``failing_batch`` (desde 1) falle como si Redis se cayera"""
+    create_many = store.create_many
+    calls = []
+
+    async def flaky(records, on_write=None):
+        calls.append(len(records))
+        if len(calls) == failing_batch:
+            raise redis.ConnectionError("Redis caído")
+        return await create_many(records, on_write=on_write)
+
+    monkeypatch.setattr(store, "create_many", flaky)
+
+
+def run_import(store, rows, batch_size=2, ndjson=False):
+    return asyncio.run(bulk_import(make_request(rows, ndjson), Row, store, officer_counters, batch_size))
+
+
+def rows(count):
+    return [{"name": f"Oficial {n}"} for n in range(1, count + 1)]
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_all_rows_are_created_in_batches(ndjson):
+    store = make_store()
+    result = run_import(store, rows(5), ndjson=ndjson)
+    assert result["status"] == "completed"
+    assert (result["created"], result["failed"]) == (5, 0)
+    assert "first_unwritten_row" not in result
+    assert asyncio.run(store.client.hget(STATS_KEY, "total_officers")) == "5"
+
+
+def test_invalid_rows_are_reported_without_stopping():
+    result = run_import(make_store(), [{"name": "A"}, {"active": True}, 3, {"name": "B"}])
+    assert result["status"] == "completed"
+    assert (result["created"], result["failed"]) == (2, 2)
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+
+
+def test_redis_failure_keeps_committed_batches_and_reports_where_to_resume(monkeypatch):
+    store = make_store()
+    fail_on_batch(monkeypatch, store, 2)
+    result = run_import(store, rows(7))
+    assert result["status"] == "interrupted"
+    assert result["created"] == 2
+    assert result["first_unwritten_row"] == 3
+    assert "Redis caído" in result["error"]
+    # Solo el primer lote quedó escrito, con sus contadores
+    assert asyncio.run(store.client.zcard(store.index_key)) == 2
+    assert asyncio.run(store.client.hget(STATS_KEY, "total_officers")) == "2"
+
+
+def test_resume_row_counts_invalid_rows(monkeypatch):
+    store = make_store()
+    fail_on_batch(monkeypatch, store, 1)
+    result = run_import(store, [{"active": True}, {"name": "A"}, {"name": "B"}])
+    assert (result["status"], result["created"], result["failed"]) == ("interrupted", 0, 1)
+    assert result["first_unwritten_row"] == 2
+
+
+def test_failure_on_the_last_partial_batch(monkeypatch):
+    store = make_store()
+    fail_on_batch(monkeypatch, store, 3)
+    result = run_import(store, rows(5))
+    assert (result["status"], result["created"], result["first_unwritten_row"]) == ("interrupted", 4, 5)
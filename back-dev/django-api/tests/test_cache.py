@@ -0,0 +1,92 @@
+"""
+Pruebas de la caché de respuestas, su ETag y su invalidación
+"""
+from starlette.requests import Request
+
+import cache
+from cache import ResponseCache
+
+
+def request(path="/api/cases/", query=b""):
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []})
+
+
+def test_hit_returns_the_same_body_and_etag():
+    responses = ResponseCache()
+    stored = responses.put("cases", request(), 0, [{"id": 1}], {"X-Next-Cursor": "1"})
+    hit = responses.get("cases", request())
+    assert hit is stored
+    response = hit.to_response()
+    assert response.status_code == 200
+    assert response.body == b'[{"id":1}]'
+    assert response.headers["etag"] == stored.etag
+    assert response.headers["x-next-cursor"] == "1"
+
+
+def test_matching_if_none_match_gets_304():
+    entry = ResponseCache().put("cases", request(), 0, [{"id": 1}])
+    assert entry.to_response(entry.etag).status_code == 304
+    assert entry.to_response(f'"otro", {entry.etag}').status_code == 304
+    assert entry.to_response('"otro"').status_code == 200
+
+
+def test_query_parameter_order_shares_an_entry():
+    responses = ResponseCache()
+    responses.put("cases", request(query=b"status=Abierto&limit=10"), 0, [])
+    assert responses.get("cases", request(query=b"limit=10&status=Abierto")) is not None
+    assert responses.get("cases", request(query=b"limit=20&status=Abierto")) is None
+
+
+def test_invalidation_drops_only_that_collection_and_changes_the_etag():
+    responses = ResponseCache()
+    old = responses.put("cases", request(), 0, [{"id": 1}])
+    responses.put("officers", request("/api/officers/"), 0, [{"id": 1}])
+
+    responses.invalidate("cases")
+    assert responses.get("cases", request()) is None
+    assert responses.get("officers", request("/api/officers/")) is not None
+
+    new = responses.put("cases", request(), responses.generation("cases"), [{"id": 1}, {"id": 2}])
+    assert new.etag != old.etag
+    # El ETag antiguo ya no vale: el cliente recibe el contenido nuevo
+    assert new.to_response(old.etag).status_code == 200
+
+
+def test_response_read_before_an_invalidation_is_not_cached():
+    responses = ResponseCache()
+    generation = responses.generation("cases")
+    # Una escritura llega mientras se leía de Redis
+    responses.invalidate("cases")
+    entry = responses.put("cases", request(), generation, [{"id": 1}])
+    assert entry.to_response().status_code == 200
+    assert responses.get("cases", request()) is None
+
+
+def test_clear_invalidates_every_collection():
+    responses = ResponseCache()
+    responses.put("cases", request(), 0, [])
+    generation = responses.generation("officers")
+    responses.clear()
+    assert responses.get("cases", request()) is None
+    assert responses.generation("officers") == generation + 1
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    responses = ResponseCache(ttl=30)
+    responses.put("cases", request(), 0, [])
+    now[0] += 29
+    assert responses.get("cases", request()) is not None
+    now[0] += 2
+    assert responses.get("cases", request()) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    responses = ResponseCache(max_entries=2)
+    for limit in (b"1", b"2"):
+        responses.put("cases", request(query=b"limit=" + limit), 0, [])
+    responses.get("cases", request(query=b"limit=1"))
+    responses.put("cases", request(query=b"limit=3"), 0, [])
+    assert responses.get("cases", request(query=b"limit=1")) is not None
+    assert responses.get("cases", request(query=b"limit=2")) is None
@@ -0,0 +1,110 @@
+"""
+Pruebas de los filtros de la exportación y de su serialización (sobre fakeredis)
+"""
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from export import csv_stream, iter_cases, ndjson_stream  # noqa: E402
+from storage import RecordStore  # noqa: E402
+
+START = datetime(2025, 6, 1)
+FIELDS = ["id", "case_number", "status", "assigned_to", "created_at"]
+
+
+def make_store(count, statuses=("Abierto", "Cerrado", "Cerrado")):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    store = RecordStore(client, "cases", indexed_fields=("status", "assigned_to"),
+                        time_indexed_fields=("created_at",))
+
+    async def fill():
+        await store.create_many([
+            {
+                "case_number": f"C-{n}",
+                "status": statuses[n % len(statuses)],
+                "assigned_to": [n % 2, 7],
+                "created_at": START + timedelta(days=n),
+            }
+            for n in range(1, count + 1)
+        ])
+
+    asyncio.run(fill())
+    return store
+
+
+def export_ids(store, **filters):
+    async def collect():
+        return [record["id"] async for record in iter_cases(store, **filters)]
+    return asyncio.run(collect())
+
+
+def count_reads(store, monkeypatch):
+    """Contar los registros que la exportación lee de Redis"""
+    read = []
+    get_many = store.get_many
+
+    async def counting(record_ids):
+        read.extend(record_ids)
+        return await get_many(record_ids)
+
+    monkeypatch.setattr(store, "get_many", counting)
+    return read
+
+
+def test_status_filter():
+    assert export_ids(make_store(9), status="Abierto") == [3, 6, 9]
+
+
+def test_time_range_filter():
+    store = make_store(9)
+    assert export_ids(store, since=START + timedelta(days=3), until=START + timedelta(days=5)) == [3, 4, 5]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 500])
+def test_status_and_time_range_are_filtered_in_redis(monkeypatch, chunk_size):
+    monkeypatch.setattr("export.EXPORT_CHUNK_SIZE", chunk_size)
+    store = make_store(30)
+    read = count_reads(store, monkeypatch)
+    ids = export_ids(store, status="Abierto", since=START + timedelta(days=4), until=START + timedelta(days=20))
+    assert ids == [6, 9, 12, 15, 18]
+    # Solo se leyeron los registros que cumplen los dos filtros
+    assert sorted(int(record_id) for record_id in read) == ids
+
+
+def test_status_without_matches_in_range(monkeypatch):
+    store = make_store(9)
+    read = count_reads(store, monkeypatch)
+    assert export_ids(store, status="Archivado", since=START) == []
+    assert read == []
+
+
+def test_csv_does_not_modify_the_records():
+    records = [{"id": 1, "case_number": "C-1", "status": "Abierto", "assigned_to": [1, 2],
+                "created_at": "2025-06-01T00:00:00"}]
+
+    async def produce():
+        for record in records:
+            yield record
+
+    async def collect():
+        return b"".join([chunk async for chunk in csv_stream(produce(), FIELDS)])
+
+    rows = list(csv.DictReader(io.StringIO(asyncio.run(collect()).decode())))
+    assert rows[0]["assigned_to"] == "1;2"
+    assert records[0]["assigned_to"] == [1, 2]
+
+
+def test_ndjson_lines_round_trip():
+    store = make_store(3)
+
+    async def collect():
+        return b"".join([chunk async for chunk in ndjson_stream(iter_cases(store))])
+
+    lines = asyncio.run(collect()).splitlines()
+    assert [json.loads(line)["case_number"] for line in lines] == ["C-1", "C-2", "C-3"]
@@ -0,0 +1,109 @@
+"""
+Pruebas de los contadores incrementales de /api/stats/ (sobre fakeredis)
+"""
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from stats import case_counters, officer_counters, read_stats  # noqa: E402
+from storage import RecordStore  # noqa: E402
+
+NOW = datetime(2025, 6, 20, 12, 0)
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def stats(client):
+    return asyncio.run(read_stats(client, now=NOW))
+
+
+def case(status="Abierto", created_at="2025-06-15T10:00:00", **fields):
+    return {"case_number": "C-1", "status": status, "assigned_to": [1],
+            "created_at": created_at, "updated_at": created_at, **fields}
+
+
+def test_empty_stats(client):
+    assert stats(client) == {
+        "total_officers": 0, "active_officers": 0, "total_cases": 0, "open_cases": 0,
+        "cases_this_month": 0, "response_time_avg": "0 minutos",
+    }
+
+
+def test_officer_counters_follow_creates_and_updates(client):
+    store = RecordStore(client, "officers", indexed_fields=("active",))
+
+    async def run():
+        first = await store.create({"name": "A", "active": True}, on_write=officer_counters)
+        await store.create({"name": "B", "active": False}, on_write=officer_counters)
+        await store.update(first["id"], {"active": False}, on_write=officer_counters)
+        await store.update(first["id"], {"active": False}, on_write=officer_counters)
+
+    asyncio.run(run())
+    assert (stats(client)["total_officers"], stats(client)["active_officers"]) == (2, 0)
+
+
+def test_case_counters_track_open_cases_and_month(client):
+    store = RecordStore(client, "cases", indexed_fields=("status",))
+
+    async def run():
+        await store.create(case(), on_write=case_counters)
+        await store.create(case(status="Cerrado"), on_write=case_counters)
+        await store.create(case(created_at="2025-05-31T23:00:00"), on_write=case_counters)
+
+    asyncio.run(run())
+    result = stats(client)
+    assert (result["total_cases"], result["open_cases"], result["cases_this_month"]) == (3, 2, 2)
+
+
+def test_closing_a_case_records_its_response_time(client):
+    store = RecordStore(client, "cases", indexed_fields=("status",))
+
+    async def run():
+        first = await store.create(case(), on_write=case_counters)
+        second = await store.create(case(), on_write=case_counters)
+        await store.update(first["id"], {"status": "Cerrado", "updated_at": "2025-06-15T11:00:00"},
+                           on_write=case_counters)
+        await store.update(second["id"], {"status": "Cerrado", "updated_at": "2025-06-15T13:00:00"},
+                           on_write=case_counters)
+        # Un cambio que no cierra el caso no vuelve a contar
+        await store.update(first["id"], {"title": "Robo", "updated_at": "2025-06-16T10:00:00"},
+                           on_write=case_counters)
+
+    asyncio.run(run())
+    result = stats(client)
+    assert result["open_cases"] == 0
+    assert result["response_time_avg"] == "120 minutos"
+
+
+def test_reopening_a_case_counts_it_as_open_again(client):
+    store = RecordStore(client, "cases", indexed_fields=("status",))
+
+    async def run():
+        created = await store.create(case(), on_write=case_counters)
+        await store.update(created["id"], {"status": "Cerrado", "updated_at": "2025-06-15T10:30:00"},
+                           on_write=case_counters)
+        await store.update(created["id"], {"status": "Abierto", "updated_at": "2025-06-15T11:00:00"},
+                           on_write=case_counters)
+
+    asyncio.run(run())
+    assert stats(client)["open_cases"] == 1
+
+
+def test_legacy_migration_counts_each_record_once(client):
+    legacy = [{"id": n, "name": f"O{n}", "active": n % 2 == 1} for n in range(1, 6)]
+
+    async def run():
+        await client.set("officers", json.dumps(legacy))
+        store = RecordStore(client, "officers", indexed_fields=("active",))
+        await store.migrate_legacy_blob(on_write=officer_counters)
+        await store.migrate_legacy_blob(on_write=officer_counters)
+
+    asyncio.run(run())
+    assert (stats(client)["total_officers"], stats(client)["active_officers"]) == (5, 3)
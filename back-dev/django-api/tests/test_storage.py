@@ -0,0 +1,86 @@
+"""
+Pruebas de la paginación por cursor de RecordStore (sobre fakeredis)
+"""
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from storage import RecordStore  # noqa: E402
+
+
+def make_store(count, deleted=()):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    store = RecordStore(client, "cases", indexed_fields=("status", "assigned_to"))
+
+    async def fill():
+        for n in range(1, count + 1):
+            await store.create({
+                "case_number": f"C-{n}",
+                "status": "Abierto" if n % 2 else "Cerrado",
+                "assigned_to": [n % 3],
+            })
+        for record_id in deleted:
+            await client.delete(store.record_key(record_id))
+            await client.zrem(store.index_key, record_id)
+            await client.zrem(store.field_index_key("status", "Abierto" if record_id % 2 else "Cerrado"), record_id)
+
+    asyncio.run(fill())
+    return store
+
+
+def page(store, limit, after=None, filters=None):
+    items, cursor = asyncio.run(store.page(limit, after, filters))
+    return [item["id"] for item in items], cursor
+
+
+def walk(store, limit, filters=None):
+    ids, cursor = page(store, limit, filters=filters)
+    pages = [ids]
+    while cursor is not None:
+        ids, cursor = page(store, limit, cursor, filters)
+        pages.append(ids)
+    return pages
+
+
+def test_empty_collection():
+    assert page(make_store(0), 10) == ([], None)
+
+
+def test_single_page_has_no_cursor():
+    assert page(make_store(3), 10) == ([1, 2, 3], None)
+
+
+def test_exact_multiple_of_limit_has_no_empty_last_page():
+    assert walk(make_store(6), 3) == [[1, 2, 3], [4, 5, 6]]
+
+
+def test_cursor_is_last_id_of_the_page():
+    assert page(make_store(7), 3) == ([1, 2, 3], 3)
+    assert page(make_store(7), 3, after=3) == ([4, 5, 6], 6)
+
+
+def test_after_last_id_and_beyond():
+    store = make_store(5)
+    assert page(store, 10, after=5) == ([], None)
+    assert page(store, 10, after=100) == ([], None)
+
+
+def test_cursor_on_a_deleted_id():
+    store = make_store(6, deleted=(3,))
+    assert page(store, 2, after=3) == ([4, 5], 5)
+    assert walk(store, 2) == [[1, 2], [4, 5], [6]]
+
+
+def test_filter_pages_use_the_index():
+    assert walk(make_store(9), 2, {"status": "Abierto"}) == [[1, 3], [5, 7], [9]]
+
+
+def test_two_filters_check_the_rest_on_each_record():
+    # Abierto: 1, 3, 5, 7, 9, 11; asignados a 1: 1, 4, 7, 10
+    assert walk(make_store(12), 1, {"status": "Abierto", "assigned_to": 1}) == [[1], [7]]
+
+
+def test_none_filters_are_ignored():
+    assert page(make_store(3), 10, filters={"status": None}) == ([1, 2, 3], None)